@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Run the D-IP / S-IP models for many instances and parameter sets.
+
+    python Batch_run.py manifest.json --workers 4 --output results.jsonl
+
+The manifest is a JSON file such as
+
+    {
+      "instances": ["Data"],
+      "parameter_sets": [
+        {"name": "dip", "model": "dip", "params": {"c": 100, "r": 1}},
+        {"name": "sip", "model": "sip", "params": {"ell": 100},
+         "scenarios": {"S1": 0.9, "S2": 1.0, "S3": 1.2},
+         "scenario_probs": {"S1": 0.3, "S2": 0.4, "S3": 0.3}}
+      ],
+      "time_limit": 600,
+      "memory_limit_mb": 4096,
+      "retries": 1
+    }
+
+Every instance is run with every parameter set. Instance paths are
+relative to the manifest. Results are streamed as one JSON line per job.
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import traceback
+from collections import deque
+import multiprocessing as mp
+from multiprocessing.connection import wait
+from DIP_model import build_dip_model
+from SIP_model import build_sip_model
+from Solve_DIP import solve_dip_model, solve_status
+from Solve_SIP import solve_sip_model, solve_sip_model_lazy
+from Load_data import load_instance, scaled_scenarios
+
+# Parsed instances, shared with the job processes through fork
+_INSTANCES = {}
+
+
+def _get_instance(data_dir):
+    """
+    Parse an instance directory once per batch.
+    """
+    if data_dir not in _INSTANCES:
+        _INSTANCES[data_dir] = load_instance(data_dir)
+    return _INSTANCES[data_dir]
+
+
+def _report_mip_progress(model, progress):
+    """
+    Forward the MIP bounds of a running solve to the progress callback.
+    """
+    if progress is None:
+        return
+    progress('solving', {})
+
+    def finite(value):
+        return value if abs(value) < float('inf') else None
+
+    def on_interrupt(e):
+        progress('solving', {'primal_bound': finite(e.data_out.mip_primal_bound),
+                             'dual_bound': finite(e.data_out.mip_dual_bound),
+                             'mip_gap': finite(e.data_out.mip_gap),
+                             'nodes': e.data_out.mip_node_count})
+
+    model.cbMipInterrupt.subscribe(on_interrupt)
+
+
+def solve_job(job, progress=None):
+    """
+    Build and solve one job and return a JSON-friendly record. If given,
+    progress(stage, info) is called when the stage changes and from the
+    HiGHS MIP callback while solving.
+    """
+    instance = _get_instance(job['instance'])
+    params = dict(job['params'])
+    build_kwargs = dict(instance, current_solution={'y_i0j': {}, 'y_ijk': {}, 'y_ij0': {}}, **params)
+
+    start = time.perf_counter()
+    if progress is not None:
+        progress('building', {})
+    if job['model'] == 'dip':
+        model, var_mapping, _ = build_dip_model(**build_kwargs)
+        build_time = time.perf_counter() - start
+        _report_mip_progress(model, progress)
+        solution = solve_dip_model(model, var_mapping, time_limit=job['time_limit'])
+    else:
+        scenario_probs = job['scenario_probs']
+        scenarios = list(scenario_probs.keys())
+        reposition_scenarios, terminal_scenarios = scaled_scenarios(instance, job['scenarios'])
+        del build_kwargs['reposition_times'], build_kwargs['terminal_times']
+        build_kwargs.update(reposition_scenarios=reposition_scenarios, terminal_scenarios=terminal_scenarios,
+                            scenario_probs=scenario_probs)
+        model, var_mapping, _ = build_sip_model(**build_kwargs)
+        build_time = time.perf_counter() - start
+        _report_mip_progress(model, progress)
+        if params.get('lazy_timing'):
+            solution = solve_sip_model_lazy(model, var_mapping, scenarios, instance['routes'], scenario_probs,
+                                            reposition_scenarios, instance['route_end_times'],
+                                            instance['route_start_times'], time_limit=job['time_limit'])
+        else:
+            solution = solve_sip_model(model, var_mapping, scenarios, instance['routes'], scenario_probs,
+                                       time_limit=job['time_limit'])
+    solve_time = time.perf_counter() - start - build_time
+
+    record = {'status': 'optimal' if solution is not None else 'not optimal',
+              'build_time': build_time, 'solve_time': solve_time}
+    if solution is not None:
+        record.update({k: v for k, v in solution.items() if k != 'delays_by_scenario'})
+    else:
+        record.update(solve_status(model))
+    return record
+
+
+def _job_process(job, conn):
+    """
+    Entry point of a job process: apply the memory limit, solve and send
+    the record back to the scheduler.
+    """
+    if job['memory_limit_mb']:
+        import resource
+        limit = int(job['memory_limit_mb']) * 1024 ** 2
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    try:
+        record = solve_job(job)
+    except MemoryError:
+        record = {'status': 'failed', 'error': 'memory limit exceeded'}
+    except Exception:
+        record = {'status': 'failed', 'error': traceback.format_exc(limit=3)}
+    conn.send(record)
+    conn.close()
+
+
+def json_default(obj):
+    # NumPy scalars in decoded results
+    if hasattr(obj, 'item'):
+        return obj.item()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+def read_manifest(manifest_path, time_limit=None, memory_limit_mb=None, retries=None):
+    """
+    Expand a manifest into one job per (instance, parameter set) pair.
+    """
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+
+    jobs = []
+    for instance in manifest['instances']:
+        data_dir = os.path.normpath(os.path.join(base_dir, instance))
+        for n, param_set in enumerate(manifest['parameter_sets']):
+            jobs.append({
+                'instance': data_dir,
+                'parameter_set': param_set.get('name', str(n)),
+                'model': param_set.get('model', 'dip'),
+                'params': param_set.get('params', {}),
+                'scenarios': param_set.get('scenarios'),
+                'scenario_probs': param_set.get('scenario_probs'),
+                'time_limit': time_limit if time_limit is not None else manifest.get('time_limit'),
+                'memory_limit_mb': memory_limit_mb if memory_limit_mb is not None else manifest.get('memory_limit_mb'),
+                'retries': retries if retries is not None else manifest.get('retries', 0),
+                'attempts': 0,
+            })
+    return jobs
+
+
+def run_batch(jobs, workers=None, out=sys.stdout, grace_time=30.0):
+    """
+    Run the jobs over a pool of local worker processes, one process per
+    job so that time and memory limits can be enforced. Jobs that crash or
+    run out of memory are retried and then skipped; a job stopped by its
+    time limit is reported as not optimal and not retried. Each result is written to out as a JSON line
+    as soon as it is available. Returns the total wall time.
+    """
+    workers = workers or os.cpu_count() or 1
+    ctx = mp.get_context('fork')
+    start = time.perf_counter()
+
+    # Jobs on the same instance run back to back and parse it only once
+    pending = deque(sorted(jobs, key=lambda job: job['instance']))
+    running = []
+
+    def emit(job, record):
+        record = dict(instance=job['instance'], parameter_set=job['parameter_set'], model=job['model'],
+                      attempts=job['attempts'], **record)
+        out.write(json.dumps(record, default=json_default) + '\n')
+        out.flush()
+
+    def finish(entry, record):
+        job = entry['job']
+        running.remove(entry)
+        entry['process'].join()
+        record['wall_time'] = time.perf_counter() - entry['started']
+        if record['status'] == 'failed' and job['attempts'] <= job['retries']:
+            pending.append(job)
+            return
+        if record['status'] == 'failed':
+            record['status'] = 'skipped'
+        emit(job, record)
+
+    while pending or running:
+        while pending and len(running) < workers:
+            job = pending.popleft()
+            job['attempts'] += 1
+            # Jobs come grouped by instance: drop the instances already done
+            # so that later job processes do not inherit them and count them
+            # against their memory limit
+            for data_dir in [d for d in _INSTANCES if d != job['instance']]:
+                del _INSTANCES[data_dir]
+            try:
+                _get_instance(job['instance'])
+            except Exception as exc:
+                emit(job, {'status': 'skipped', 'error': f'cannot load instance: {exc}'})
+                continue
+            receiver, sender = ctx.Pipe(duplex=False)
+            process = ctx.Process(target=_job_process, args=(job, sender), daemon=True)
+            process.start()
+            sender.close()
+            running.append({'job': job, 'process': process, 'conn': receiver, 'started': time.perf_counter()})
+
+        if not running:
+            continue
+
+        wait([entry['conn'] for entry in running], timeout=0.5)
+        for entry in list(running):
+            job, process, conn = entry['job'], entry['process'], entry['conn']
+            if conn.poll():
+                try:
+                    record = conn.recv()
+                except EOFError:
+                    record = {'status': 'failed', 'error': f'worker exited with code {process.exitcode}'}
+                finish(entry, record)
+            elif not process.is_alive():
+                finish(entry, {'status': 'failed', 'error': f'worker exited with code {process.exitcode}'})
+            elif job['time_limit'] and time.perf_counter() - entry['started'] > job['time_limit'] + grace_time:
+                # Another attempt would hit the same limit
+                process.terminate()
+                finish(entry, {'status': 'not optimal', 'solver_status': 'Time limit reached',
+                               'error': 'job killed after its time limit'})
+
+    return time.perf_counter() - start
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Batch runs of the D-IP / S-IP bus assignment models")
+    parser.add_argument('manifest', help="JSON manifest of instance directories and parameter sets")
+    parser.add_argument('--workers', type=int, default=None, help="number of parallel jobs (default: CPU count)")
+    parser.add_argument('--output', default=None, help="JSON lines output file (default: stdout)")
+    parser.add_argument('--time-limit', type=float, default=None, help="per-job time limit in seconds")
+    parser.add_argument('--memory-limit-mb', type=int, default=None, help="per-job memory limit in MB")
+    parser.add_argument('--retries', type=int, default=None, help="retries for failed jobs")
+    args = parser.parse_args(argv)
+
+    jobs = read_manifest(args.manifest, args.time_limit, args.memory_limit_mb, args.retries)
+    out = open(args.output, 'a') if args.output else sys.stdout
+    try:
+        wall_time = run_batch(jobs, args.workers, out)
+    finally:
+        if args.output:
+            out.close()
+    print(f"{len(jobs)} jobs finished in {wall_time:.1f} s", file=sys.stderr)
+
+
+if __name__ == '__main__':
+    main()
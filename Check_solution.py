@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy as np
+from Terminal_depots import as_depot_table
+
+# A plan in array form is a pair of (R,) or (P x R) integer arrays:
+#   route_bus  : index of the bus serving each route, -1 if unserved
+#   successors : index of the route served next by the same bus, -1 if the
+#                bus returns to its depot afterwards
+
+
+def instance_arrays(
+    buses, routes, route_loads, route_wc_loads, bus_capacities, bus_wc_capacities,
+    route_durations, route_end_times, route_start_times, reposition_miles, reposition_times,
+    terminal_miles
+):
+    """
+    Pack an instance into NumPy arrays indexed by bus and route position.
+    Missing reposition pairs are infinite.
+    """
+    route_pos = {j: n for n, j in enumerate(routes)}
+    R = len(routes)
+
+    def pair_matrix(values):
+        matrix = np.full((R, R), np.inf)
+        for (j, k), value in values.items():
+            if j in route_pos and k in route_pos:
+                matrix[route_pos[j], route_pos[k]] = value
+        return matrix
+
+    terminal_miles = as_depot_table(buses, routes, terminal_miles)
+    table_cols = [{j: n for n, j in enumerate(terminal_miles['routes'])}[j] for j in routes]
+
+    return {
+        'buses': list(buses),
+        'routes': list(routes),
+        'route_loads': np.array([route_loads[j] for j in routes], dtype=np.float64),
+        'route_wc_loads': np.array([route_wc_loads[j] for j in routes], dtype=np.float64),
+        'bus_capacities': np.array([bus_capacities[i] for i in buses], dtype=np.float64),
+        'bus_wc_capacities': np.array([bus_wc_capacities[i] for i in buses], dtype=np.float64),
+        'route_durations': np.array([route_durations[j] for j in routes], dtype=np.float64),
+        'route_end_times': np.array([route_end_times[j] for j in routes], dtype=np.float64),
+        'route_start_times': np.array([route_start_times[j] for j in routes], dtype=np.float64),
+        'reposition_miles': pair_matrix(reposition_miles),
+        'reposition_times': pair_matrix(reposition_times),
+        'bus_depot': np.array([terminal_miles['bus_depot'][i] for i in buses], dtype=np.int64),
+        'miles_to_route': terminal_miles['to_route'][:, table_cols],
+        'miles_from_route': terminal_miles['from_route'][:, table_cols],
+    }
+
+
+def plan_arrays(bus_assignments, instance):
+    """
+    Convert a bus_assignments dict (bus -> ordered routes) into the array
+    form of a plan.
+    """
+    bus_pos = {i: n for n, i in enumerate(instance['buses'])}
+    route_pos = {j: n for n, j in enumerate(instance['routes'])}
+    route_bus = np.full(len(route_pos), -1, dtype=np.int64)
+    successors = np.full(len(route_pos), -1, dtype=np.int64)
+    for i, chain in bus_assignments.items():
+        idx = [route_pos[j] for j in chain]
+        route_bus[idx] = bus_pos[i]
+        successors[idx[:-1]] = idx[1:]
+    return route_bus, successors
+
+
+def check_plans(route_bus, successors, instance, c=100, e=1000, r=1, v=50, s=0, b=15, current=None):
+    """
+    Validate a batch of plans in array form against the instance and
+    recompute the objective components (A.1)-(A.5). (A.1) counts the
+    distinct buses used; a bus driving several chains violates (A.6). (A.4) rewards every
+    assignment kept from the current plan, given as a (route_bus,
+    successors) pair. Every result is an array with one entry per plan.
+    """
+    route_bus = np.atleast_2d(route_bus)
+    successors = np.atleast_2d(successors)
+    P, R = route_bus.shape
+    rows = np.arange(P)[:, None]
+
+    served = route_bus >= 0
+    bus = np.where(served, route_bus, 0)
+    has_next = successors >= 0
+    nxt = np.where(has_next, successors, 0)
+
+    # Full route coverage
+    unserved = ~served
+
+    # Capacity: bus_capacities / route_wc_loads
+    over_capacity = served & (
+        (instance['route_loads'][None, :] > instance['bus_capacities'][bus])
+        | (instance['route_wc_loads'][None, :] > instance['bus_wc_capacities'][bus])
+    )
+
+    # Time: end + reposition <= next start, on the same bus
+    end_times = instance['route_end_times']
+    arrival = end_times[None, :] + instance['reposition_times'][np.arange(R)[None, :], nxt]
+    late = has_next & (arrival > instance['route_start_times'][nxt])
+    broken_chain = has_next & (~served | (route_bus[rows, nxt] != route_bus) | (nxt == np.arange(R)[None, :]))
+
+    # Each route may follow at most one other route
+    predecessors = np.zeros((P, R), dtype=np.int64)
+    np.add.at(predecessors, (np.broadcast_to(rows, (P, R))[has_next], successors[has_next]), 1)
+    shared_successor = predecessors > 1
+
+    # Chain starts and ends
+    is_first = served & (predecessors == 0)
+    is_last = served & ~has_next
+    depot = instance['bus_depot'][bus]
+
+    # (A.6) each bus drives at most one chain: count chain starts and served
+    # routes per (plan, bus)
+    B = len(instance['buses'])
+    flat_bus = (rows * B + bus).ravel()
+    chains = np.bincount(flat_bus[is_first.ravel()], minlength=P * B).reshape(P, B)
+    bus_routes = np.bincount(flat_bus[served.ravel()], minlength=P * B).reshape(P, B)
+    multiple_chains = served & (chains[rows, bus] > 1)
+
+    # (A.1) buses used, (A.2) unserved routes, (A.3) reposition miles
+    buses_used = (bus_routes > 0).sum(axis=1)
+    miles = (
+        np.where(is_first, instance['miles_to_route'][depot, np.arange(R)[None, :]], 0.0).sum(axis=1)
+        + np.where(has_next, instance['reposition_miles'][np.arange(R)[None, :], nxt], 0.0).sum(axis=1)
+        + np.where(is_last, instance['miles_from_route'][depot, np.arange(R)[None, :]], 0.0).sum(axis=1)
+    )
+
+    # (A.5) small slack penalty
+    slack = end_times[nxt] - end_times[None, :] - instance['route_durations'][nxt] \
+        - instance['reposition_times'][np.arange(R)[None, :], nxt]
+    slack = np.where(has_next, slack, b)
+    slack_penalty = (s * np.maximum(b - slack, 0.0)).sum(axis=1)
+
+    # (A.4) assignments kept from the current plan
+    kept = np.zeros(P)
+    if current is not None:
+        current_bus, current_next = (np.asarray(a) for a in current)
+        current_first = current_bus >= 0
+        current_first[current_next[current_next >= 0]] = False
+        same_bus = served & (route_bus == current_bus[None, :])
+        kept = (
+            (same_bus & is_first & current_first[None, :]).sum(axis=1)
+            + (same_bus & has_next & (successors == current_next[None, :])).sum(axis=1)
+            + (same_bus & is_last & (current_bus >= 0)[None, :] & (current_next < 0)[None, :]).sum(axis=1)
+        )
+
+    components = {
+        'A.1': c * buses_used,
+        'A.2': e * unserved.sum(axis=1),
+        'A.3': r * miles,
+        'A.4': -v * kept,
+        'A.5': slack_penalty,
+    }
+    violations = {
+        'unserved': unserved,
+        'over_capacity': over_capacity,
+        'late_arrival': late,
+        'broken_chain': broken_chain,
+        'shared_successor': shared_successor,
+        'multiple_chains': multiple_chains,
+    }
+    feasible = ~(over_capacity | late | broken_chain | shared_successor | multiple_chains | unserved).any(axis=1)
+
+    return {
+        'feasible': feasible,
+        'violations': violations,
+        'buses_used': buses_used,
+        'reposition_miles': miles,
+        'components': components,
+        'objective_value': sum(components.values()),
+    }
+
+
+def check_plan(bus_assignments, instance, **penalties):
+    """
+    Validate a single bus_assignments dict. Violations are reported as
+    lists of route names.
+    """
+    route_bus, successors = plan_arrays(bus_assignments, instance)
+    result = check_plans(route_bus, successors, instance, **penalties)
+    routes = np.array(instance['routes'], dtype=object)
+
+    return {
+        'feasible': bool(result['feasible'][0]),
+        'violations': {name: list(routes[mask[0]]) for name, mask in result['violations'].items()},
+        'buses_used': int(result['buses_used'][0]),
+        'reposition_miles': float(result['reposition_miles'][0]),
+        'components': {name: float(value[0]) for name, value in result['components'].items()},
+        'objective_value': float(result['objective_value'][0]),
+    }
+
+
+def bus_miles(route_bus, successors, instance):
+    """
+    Reposition miles driven by each bus under one plan in array form,
+    as an array indexed by bus position.
+    """
+    R = len(instance['routes'])
+    served = route_bus >= 0
+    has_next = successors >= 0
+    is_first = served.copy()
+    is_first[successors[has_next]] = False
+    is_last = served & ~has_next
+    depot = instance['bus_depot'][np.where(served, route_bus, 0)]
+    route_idx = np.arange(R)
+
+    miles = (
+        np.where(is_first, instance['miles_to_route'][depot, route_idx], 0.0)
+        + np.where(has_next, instance['reposition_miles'][route_idx, np.where(has_next, successors, 0)], 0.0)
+        + np.where(is_last, instance['miles_from_route'][depot, route_idx], 0.0)
+    )
+    return np.bincount(route_bus[served], weights=miles[served], minlength=len(instance['buses']))
@@ -2,21 +2,31 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import highspy
-import pandas as pd
+from Terminal_depots import as_depot_table, depot_lookup
+from Symmetry import bus_orbits, add_symmetry_breaking
 
 def build_dip_model(
     buses, routes, route_loads, route_wc_loads, bus_capacities, bus_wc_capacities,
     route_durations, route_end_times, route_start_times, reposition_miles, reposition_times,
     terminal_miles, terminal_times, current_solution,
-    c=100, e=1000, r=1, v=50, s=0, b=15, alpha=0, beta=0, w=0, w_bar=300, p=None
+    c=100, e=1000, r=1, v=50, s=0, b=15, alpha=0, beta=0, w=0, w_bar=300, p=None, arc_mask=None,
+    symmetry_breaking=False
 ):
     """
     Build the Deterministic Integer Programming model for bus-route assignment
     using the HiGHSpy optimizer.
+    If arc_mask (a set of (j, k) route pairs) is given, it replaces the time
+    feasibility check for consecutive routes and the time-based constraints
+    (A.9)-(A.11) are left to the caller, e.g. as column bounds.
+    With symmetry_breaking, interchangeable buses are ordered (see Symmetry.py).
     """
     # Create a new HiGHSpy model
     model = highspy.Highs()
     model.setOptionValue("log_to_console", False)
+    
+    # Terminal costs are looked up per depot rather than per bus
+    terminal_miles = as_depot_table(buses, routes, terminal_miles)
+    terminal_times = as_depot_table(buses, routes, terminal_times)
 
     F_ij = {}  # Capacity feasibility
     F_ijk = {} # Time and capacity feasibility
@@ -31,7 +41,9 @@ def build_dip_model(
     for i in buses:
         for j in routes:
             for k in routes:
-                if j != k and F_ij[(i, j)] and F_ij[(i, k)]:
+                if j != k and F_ij[(i, j)] and F_ij[(i, k)] and arc_mask is not None:
+                    F_ijk[(i, j, k)] = (j, k) in arc_mask
+                elif j != k and F_ij[(i, j)] and F_ij[(i, k)]:
                     # Calculate buffer for reposition time
                     buffer_time = ((1 + beta) * reposition_times[(j, k)]) + alpha
                     
@@ -46,10 +58,18 @@ def build_dip_model(
     var_index = {}
     var_count = 0
     
+    # Columns of each variable type, for vectorized cost lookups
+    first_cols, first_buses, first_routes = [], [], []
+    arc_cols, arc_from, arc_to = [], [], []
+    last_cols, last_buses, last_routes = [], [], []
+    
     # Variables y_i0j (bus i serves route j first)
     for i in buses:
         for j in routes:
             if F_ij[(i, j)]:
+                first_cols.append(var_count)
+                first_buses.append(i)
+                first_routes.append(j)
                 var_mapping[var_count] = ('y_i0j', i, j)
                 var_index[('y_i0j', i, j)] = var_count
                 var_count += 1
@@ -59,6 +79,9 @@ def build_dip_model(
         for j in routes:
             for k in routes:
                 if j != k and F_ijk[(i, j, k)]:
+                    arc_cols.append(var_count)
+                    arc_from.append(j)
+                    arc_to.append(k)
                     var_mapping[var_count] = ('y_ijk', i, j, k)
                     var_index[('y_ijk', i, j, k)] = var_count
                     var_count += 1
@@ -67,6 +90,9 @@ def build_dip_model(
     for i in buses:
         for j in routes:
             if F_ij[(i, j)]:
+                last_cols.append(var_count)
+                last_buses.append(i)
+                last_routes.append(j)
                 var_mapping[var_count] = ('y_ij0', i, j)
                 var_index[('y_ij0', i, j)] = var_count
                 var_count += 1
@@ -100,16 +126,10 @@ def build_dip_model(
             obj_comp2[v] = e
     
     # Component 3: Penalty for reposition miles (A.3)
-    for v in range(var_count):
-        if var_mapping[v][0] == 'y_i0j':
-            i, j = var_mapping[v][1], var_mapping[v][2]
-            obj_comp3[v] = r * terminal_miles[('terminal', i, j)]
-        elif var_mapping[v][0] == 'y_ij0':
-            i, j = var_mapping[v][1], var_mapping[v][2]
-            obj_comp3[v] = r * terminal_miles[(j, 'terminal', i)]
-        elif var_mapping[v][0] == 'y_ijk':
-            _, i, j, k = var_mapping[v]
-            obj_comp3[v] = r * reposition_miles[(j, k)]
+    obj_comp3[first_cols] = r * depot_lookup(terminal_miles, first_buses, first_routes, 'to_route')
+    obj_comp3[last_cols] = r * depot_lookup(terminal_miles, last_buses, last_routes, 'from_route')
+    obj_comp3[arc_cols] = r * np.fromiter((reposition_miles[(j, k)] for j, k in zip(arc_from, arc_to)),
+                                          dtype=np.float64, count=len(arc_cols))
     
     
     # Component 5: Penalty for small slack time (A.5)
@@ -212,15 +232,23 @@ def build_dip_model(
         values_np = np.array(values, dtype=np.float64)
         model.addRow(1.0, 1.0, len(indices_np), indices_np, values_np)
     
+    # Ordering constraints within groups of interchangeable buses
+    if symmetry_breaking:
+        orbits = bus_orbits(buses, routes, bus_capacities, bus_wc_capacities, [terminal_miles, terminal_times])
+        add_symmetry_breaking(model, var_index, orbits, routes)
+    
+    # Time-based constraints are handled by the caller
+    if arc_mask is not None:
+        return model, var_mapping, var_index
+    
     # Optional constraints
     # Constraint (A.9): Lower bound on departure time from terminal
     if p is not None:
-        for i in buses:
-            for j in routes:
-                if F_ij[(i, j)] and ('y_i0j', i, j) in var_index:
-                    indices = np.array([var_index[('y_i0j', i, j)]], dtype=np.int32)
-                    values = np.array([p + terminal_times[('terminal', i, j)]], dtype=np.float64)
-                    model.addRow(-inf, route_end_times[j] - route_durations[j], 1, indices, values)
+        first_times = depot_lookup(terminal_times, first_buses, first_routes, 'to_route')
+        for v, j, terminal_time in zip(first_cols, first_routes, first_times):
+            indices = np.array([v], dtype=np.int32)
+            values = np.array([p + terminal_time], dtype=np.float64)
+            model.addRow(-inf, route_end_times[j] - route_durations[j], 1, indices, values)
     
     # Constraint (A.10): Lower bound on slack time
     if w > 0:
@@ -246,8 +274,6 @@ def build_dip_model(
                             values = np.array([1.0], dtype=np.float64)
                             model.addRow(0.0, 0.0, 1, indices, values)
     
-    F_ijk[(i, j, k)] = (route_end_times[j] + buffer_time <= route_start_times[k])
-    
     for i in buses:
    
         for j in routes:
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import json
+import os
+import pickle
+from Terminal_depots import load_depot_table, scaled_depot_table
+
+# An instance directory holds instance.json (fleet, routes and the names of
+# the CSV tables) next to the CSV tables themselves, as in Data/. An
+# optional "bus_depots" object maps each bus to its depot; without it,
+# buses with identical terminal rows share a depot. The terminal CSVs in
+# Data/ give every bus its own rows, so that instance has one depot per bus.
+INSTANCE_FILE = 'instance.json'
+
+# Parsed instance cached next to the sources, read without pandas
+INSTANCE_CACHE = 'instance.pkl'
+
+
+def _pair_table(csv_path, cast):
+    """
+    Read a route x route matrix CSV into a (from_route, to_route) dictionary.
+    """
+    import pandas as pd
+    df = pd.read_csv(csv_path, index_col=0)
+    stacked = df.stack().dropna()
+    return {
+        (from_route, to_route): cast(value)
+        for (from_route, to_route), value in stacked.items()
+        if from_route != to_route
+    }
+
+
+def load_instance(data_dir):
+    """
+    Load an instance directory into a dictionary whose keys are the input
+    arguments of build_dip_model / build_sip_model.
+    """
+    import pandas as pd
+    with open(os.path.join(data_dir, INSTANCE_FILE)) as f:
+        spec = json.load(f)
+    files = {name: os.path.join(data_dir, path) for name, path in spec['files'].items()}
+    buses, routes = spec['buses'], spec['routes']
+    bus_depots = spec.get('bus_depots')
+
+    schedule = pd.read_csv(files['route_schedule']).set_index('route')
+
+    return {
+        'buses': buses,
+        'routes': routes,
+        'route_loads': spec['route_loads'],
+        'route_wc_loads': spec['route_wc_loads'],
+        'bus_capacities': spec['bus_capacities'],
+        'bus_wc_capacities': spec['bus_wc_capacities'],
+        'route_durations': spec['route_durations'],
+        'route_start_times': {j: int(schedule.loc[j, 'start_time']) for j in routes},
+        'route_end_times': {j: int(schedule.loc[j, 'end_time']) for j in routes},
+        'reposition_times': _pair_table(files['reposition_times'], int),
+        'reposition_miles': _pair_table(files['reposition_miles'], float),
+        'terminal_times': load_depot_table(files['terminal_times'], buses, routes, 'time', bus_depots),
+        'terminal_miles': load_depot_table(files['terminal_miles'], buses, routes, 'miles', bus_depots),
+    }
+
+
+def load_cached_instance(data_dir):
+    """
+    Same as load_instance, through a pickle of the parsed instance that is
+    rebuilt whenever instance.json or one of its CSV tables is newer.
+    """
+    spec_path = os.path.join(data_dir, INSTANCE_FILE)
+    cache_path = os.path.join(data_dir, INSTANCE_CACHE)
+    with open(spec_path) as f:
+        sources = [spec_path] + [os.path.join(data_dir, path) for path in json.load(f)['files'].values()]
+
+    if os.path.exists(cache_path) and \
+            os.path.getmtime(cache_path) >= max(os.path.getmtime(path) for path in sources):
+        with open(cache_path, 'rb') as f:
+            return pickle.load(f)
+
+    instance = load_instance(data_dir)
+    tmp_path = cache_path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        pickle.dump(instance, f, protocol=pickle.HIGHEST_PROTOCOL)
+    os.replace(tmp_path, cache_path)
+    return instance
+
+
+def scaled_scenarios(instance, scenario_factors):
+    """
+    Reposition and terminal time scenarios obtained by scaling the mean
+    times of the instance, e.g. {'S1': 0.9, 'S2': 1.0, 'S3': 1.2}.
+    """
+    reposition_scenarios = {
+        u: {k: t * factor for k, t in instance['reposition_times'].items()}
+        for u, factor in scenario_factors.items()
+    }
+    terminal_scenarios = {
+        u: scaled_depot_table(instance['terminal_times'], factor)
+        for u, factor in scenario_factors.items()
+    }
+    return reposition_scenarios, terminal_scenarios
@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import hashlib
+import inspect
+import os
+import pickle
+import zlib
+import numpy as np
+import highspy
+from DIP_model import build_dip_model
+from SIP_model import build_sip_model
+from Solve_DIP import solve_dip_model
+from Solve_SIP import solve_sip_model, solve_sip_model_lazy
+
+# Default upper bound on the total size of the cache directory (bytes)
+DEFAULT_MAX_BYTES = 2 * 1024 ** 3
+
+# File suffixes making up one cache entry
+MODEL_SUFFIX = '.mps'
+MAPPING_SUFFIX = '.map'
+RESULT_SUFFIX = '.res'
+
+
+def _feed(hasher, obj):
+    """
+    Feed an input object into the hasher in a canonical form.
+    """
+    if isinstance(obj, dict):
+        hasher.update(b'{')
+        for key in sorted(obj, key=repr):
+            _feed(hasher, key)
+            _feed(hasher, obj[key])
+        hasher.update(b'}')
+    elif isinstance(obj, (list, tuple)):
+        hasher.update(b'[' if isinstance(obj, list) else b'(')
+        for item in obj:
+            _feed(hasher, item)
+        hasher.update(b']')
+    elif isinstance(obj, np.ndarray):
+        hasher.update(f'nd{obj.dtype.str}{obj.shape}'.encode())
+        hasher.update(np.ascontiguousarray(obj).tobytes())
+    elif isinstance(obj, (float, np.floating)):
+        # Same fingerprint for 10 and 10.0
+        hasher.update(repr(float(obj)).encode())
+    elif isinstance(obj, (bool, np.bool_)):
+        hasher.update(repr(bool(obj)).encode())
+    elif isinstance(obj, (int, np.integer)):
+        hasher.update(repr(float(obj)).encode())
+    else:
+        hasher.update(repr(obj).encode())
+    hasher.update(b';')
+
+
+def instance_fingerprint(build_fn, build_kwargs):
+    """
+    Content hash of the instance data and penalty parameters passed to a
+    model builder. Defaults are filled in so that spelling out a default
+    value does not change the fingerprint.
+    """
+    bound = inspect.signature(build_fn).bind(**build_kwargs)
+    bound.apply_defaults()
+
+    hasher = hashlib.sha256()
+    _feed(hasher, build_fn.__name__)
+    for name, value in bound.arguments.items():
+        _feed(hasher, name)
+        _feed(hasher, value)
+    return hasher.hexdigest()
+
+
+def _entry_path(cache_dir, key, suffix):
+    return os.path.join(cache_dir, key + suffix)
+
+
+def _write_atomic(path, payload):
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(payload)
+    os.replace(tmp_path, path)
+
+
+def _read_blob(path):
+    with open(path, 'rb') as f:
+        return pickle.loads(zlib.decompress(f.read()))
+
+
+def _write_blob(path, obj):
+    _write_atomic(path, zlib.compress(pickle.dumps(obj, protocol=pickle.HIGHEST_PROTOCOL)))
+
+
+def _touch(cache_dir, key):
+    """
+    Mark every file of an entry as recently used.
+    """
+    for suffix in (MODEL_SUFFIX, MAPPING_SUFFIX, RESULT_SUFFIX):
+        path = _entry_path(cache_dir, key, suffix)
+        if os.path.exists(path):
+            os.utime(path)
+
+
+def evict_cache(cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Remove the least recently used entries until the cache directory fits
+    in max_bytes.
+    """
+    entries = {}
+    for name in os.listdir(cache_dir):
+        key, suffix = os.path.splitext(name)
+        if suffix not in (MODEL_SUFFIX, MAPPING_SUFFIX, RESULT_SUFFIX):
+            continue
+        stat = os.stat(os.path.join(cache_dir, name))
+        size, last_used = entries.get(key, (0, 0.0))
+        entries[key] = (size + stat.st_size, max(last_used, stat.st_mtime))
+
+    total = sum(size for size, _ in entries.values())
+    for key in sorted(entries, key=lambda k: entries[k][1]):
+        if total <= max_bytes:
+            break
+        for suffix in (MODEL_SUFFIX, MAPPING_SUFFIX, RESULT_SUFFIX):
+            path = _entry_path(cache_dir, key, suffix)
+            if os.path.exists(path):
+                os.remove(path)
+        total -= entries[key][0]
+
+
+def cached_build_model(cache_dir, build_fn, build_kwargs, max_bytes=DEFAULT_MAX_BYTES):
+    """
+    Build a model through the cache. On a hit the model is read back from
+    MPS and the builder is skipped.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    key = instance_fingerprint(build_fn, build_kwargs)
+    model_path = _entry_path(cache_dir, key, MODEL_SUFFIX)
+    mapping_path = _entry_path(cache_dir, key, MAPPING_SUFFIX)
+
+    if os.path.exists(model_path) and os.path.exists(mapping_path):
+        model = highspy.Highs()
+        model.setOptionValue("log_to_console", False)
+        model.readModel(model_path)
+        var_mapping = _read_blob(mapping_path)
+        var_index = {name: v for v, name in var_mapping.items()}
+        _touch(cache_dir, key)
+        return model, var_mapping, var_index
+
+    model, var_mapping, var_index = build_fn(**build_kwargs)
+    tmp_path = model_path + '.tmp.mps'
+    model.writeModel(tmp_path)
+    os.replace(tmp_path, model_path)
+    _write_blob(mapping_path, var_mapping)
+    evict_cache(cache_dir, max_bytes)
+    return model, var_mapping, var_index
+
+
+def _cached_solve(cache_dir, build_fn, build_kwargs, solve, max_bytes):
+    os.makedirs(cache_dir, exist_ok=True)
+    key = instance_fingerprint(build_fn, build_kwargs)
+    result_path = _entry_path(cache_dir, key, RESULT_SUFFIX)
+
+    # A result hit skips both the build and the solve
+    if os.path.exists(result_path):
+        _touch(cache_dir, key)
+        return _read_blob(result_path)
+
+    model, var_mapping, var_index = cached_build_model(cache_dir, build_fn, build_kwargs, max_bytes)
+    result = solve(model, var_mapping)
+
+    # Only optimal results are worth keeping
+    if result is not None:
+        _write_blob(result_path, result)
+        evict_cache(cache_dir, max_bytes)
+    return result
+
+
+def cached_solve_dip(cache_dir, build_kwargs, max_bytes=DEFAULT_MAX_BYTES, **solve_kwargs):
+    """
+    Build and solve the D-IP model through the cache.
+    """
+    def solve(model, var_mapping):
+        return solve_dip_model(model, var_mapping, **solve_kwargs)
+
+    return _cached_solve(cache_dir, build_dip_model, build_kwargs, solve, max_bytes)
+
+
+def cached_solve_sip(cache_dir, build_kwargs, max_bytes=DEFAULT_MAX_BYTES, **solve_kwargs):
+    """
+    Build and solve the S-IP model through the cache. A model built with
+    lazy_timing is solved with solve_sip_model_lazy.
+    """
+    scenarios = list(build_kwargs['scenario_probs'].keys())
+
+    def solve(model, var_mapping):
+        if build_kwargs.get('lazy_timing'):
+            return solve_sip_model_lazy(model, var_mapping, scenarios, build_kwargs['routes'],
+                                        build_kwargs['scenario_probs'], build_kwargs['reposition_scenarios'],
+                                        build_kwargs['route_end_times'], build_kwargs['route_start_times'],
+                                        **solve_kwargs)
+        return solve_sip_model(model, var_mapping, scenarios, build_kwargs['routes'],
+                               build_kwargs['scenario_probs'], **solve_kwargs)
+
+    return _cached_solve(cache_dir, build_sip_model, build_kwargs, solve, max_bytes)
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import inspect
+import time
+import numpy as np
+import highspy
+from DIP_model import build_dip_model
+from Pareto_sweep import column_miles
+from Solve_DIP import interpret_dip_solution
+from Terminal_depots import as_depot_table, depot_lookup
+
+# Inputs of build_dip_model that may change from one day to the next
+DAY_FIELDS = (
+    'route_durations', 'route_end_times', 'route_start_times', 'reposition_miles',
+    'reposition_times', 'terminal_miles', 'terminal_times',
+)
+
+
+def _available_arcs(day, routes, alpha, beta, w, w_bar):
+    """
+    Route pairs (j, k) that one bus can serve back to back on a day: the
+    checks of build_dip_model, constraints (A.10), (A.11) and the start
+    time check.
+    """
+    end, start, duration, reposition = (day['route_end_times'], day['route_start_times'],
+                                        day['route_durations'], day['reposition_times'])
+    arcs = set()
+    for j in routes:
+        for k in routes:
+            if j == k:
+                continue
+            if end[j] + (1 + beta) * reposition[(j, k)] + alpha + duration[k] > end[k]:
+                continue
+            if end[j] + reposition[(j, k)] > start[k]:
+                continue
+            slack = end[k] - end[j] - duration[k] - reposition[(j, k)]
+            if (w > 0 and slack < w) or slack > w_bar:
+                continue
+            arcs.add((j, k))
+    return arcs
+
+
+def _day_columns(day, var_mapping, buses, routes, arcs, params):
+    """
+    Column costs and upper bounds of the superset model for one day.
+    """
+    num_col = len(var_mapping)
+    kinds = [key[0] for key in var_mapping.values()]
+    first_cols = [v for v in range(num_col) if kinds[v] == 'y_i0j']
+    arc_cols = [v for v in range(num_col) if kinds[v] == 'y_ijk']
+
+    # Objective (A.1)-(A.3) and (A.5)
+    cost = params['r'] * column_miles(var_mapping, buses, routes, day['reposition_miles'], day['terminal_miles'])
+    cost[first_cols] += params['c']
+    cost[[v for v in range(num_col) if kinds[v] == 'x_j']] = params['e']
+    if params['s'] > 0:
+        for v in arc_cols:
+            j, k = var_mapping[v][2], var_mapping[v][3]
+            slack = (day['route_end_times'][k] - day['route_end_times'][j] - day['route_durations'][k]
+                     - day['reposition_times'][(j, k)])
+            if slack < params['b']:
+                cost[v] += params['s'] * (params['b'] - slack)
+
+    # Arcs that are infeasible today, and (A.9) first routes out of reach
+    upper = np.ones(num_col)
+    upper[arc_cols] = [(var_mapping[v][2], var_mapping[v][3]) in arcs for v in arc_cols]
+    if params['p'] is not None:
+        terminal_times = as_depot_table(buses, routes, day['terminal_times'])
+        first_times = depot_lookup(terminal_times, [var_mapping[v][1] for v in first_cols],
+                                   [var_mapping[v][2] for v in first_cols], 'to_route')
+        latest = np.array([day['route_end_times'][var_mapping[v][2]] - day['route_durations'][var_mapping[v][2]]
+                           for v in first_cols])
+        upper[first_cols] = params['p'] + first_times <= latest
+    return cost, upper
+
+
+def solve_days(build_kwargs, days, time_limit=None, warm_start=True):
+    """
+    Solve the D-IP model for several days that share the fleet and route
+    set but differ in schedule and travel times. days is a list of dicts
+    overriding the DAY_FIELDS of build_kwargs. One superset model holding
+    every arc feasible on some day is built once; each day then only
+    switches arcs on or off through column bounds, updates the costs and
+    is re-solved warm from the previous day's plan.
+    """
+    defaults = {name: param.default for name, param in inspect.signature(build_dip_model).parameters.items()}
+    params = {name: build_kwargs.get(name, defaults[name]) for name in
+              ('c', 'e', 'r', 's', 'b', 'alpha', 'beta', 'w', 'w_bar', 'p')}
+    buses, routes = build_kwargs['buses'], build_kwargs['routes']
+    days = [dict({name: build_kwargs[name] for name in DAY_FIELDS}, **day) for day in days]
+
+    start = time.perf_counter()
+    day_arcs = [_available_arcs(day, routes, params['alpha'], params['beta'], params['w'], params['w_bar'])
+                for day in days]
+    superset = set().union(*day_arcs)
+    model, var_mapping, var_index = build_dip_model(**dict(build_kwargs, arc_mask=superset))
+    if time_limit is not None:
+        model.setOptionValue("time_limit", float(time_limit))
+    build_time = time.perf_counter() - start
+
+    num_col = model.getNumCol()
+    all_cols = np.arange(num_col, dtype=np.int32)
+    # Columns fixed by the builder (e.g. symmetry breaking) stay fixed
+    base_upper = np.array(model.getLp().col_upper_)
+    results = []
+    previous = None
+    for day, arcs in zip(days, day_arcs):
+        day_start = time.perf_counter()
+        cost, upper = _day_columns(day, var_mapping, buses, routes, arcs, params)
+        model.changeColsCost(num_col, all_cols, cost)
+        model.changeColsBounds(num_col, all_cols, np.zeros(num_col), np.minimum(upper, base_upper))
+
+        # Yesterday's plan is only a hint: HiGHS drops it if it no longer fits
+        if warm_start and previous is not None:
+            model.setSolution(previous)
+        model.run()
+        solve_time = time.perf_counter() - day_start
+
+        status = model.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            results.append({'status': model.modelStatusToString(status), 'solve_time': solve_time})
+            continue
+        previous = model.getSolution()
+        solution = interpret_dip_solution(previous.col_value, var_mapping, model.getObjectiveValue())
+        results.append(dict(solution, status='optimal', solve_time=solve_time))
+
+    return {
+        'days': results,
+        'num_arcs': len(superset),
+        'build_time': build_time,
+        'total_time': time.perf_counter() - start,
+    }
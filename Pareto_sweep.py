@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import inspect
+import time
+import numpy as np
+import highspy
+from Solve_DIP import interpret_dip_solution
+from Terminal_depots import as_depot_table, depot_lookup
+
+
+def column_miles(var_mapping, buses, routes, reposition_miles, terminal_miles):
+    """
+    Reposition miles driven when each column is 1 (zero for non-arc columns).
+    """
+    terminal_miles = as_depot_table(buses, routes, terminal_miles)
+    miles = np.zeros(len(var_mapping))
+    first = [(v, key[1], key[2]) for v, key in var_mapping.items() if key[0] == 'y_i0j']
+    last = [(v, key[1], key[2]) for v, key in var_mapping.items() if key[0] == 'y_ij0']
+    arcs = [(v, key[2], key[3]) for v, key in var_mapping.items() if key[0] == 'y_ijk']
+    if first:
+        cols, bus_list, route_list = zip(*first)
+        miles[list(cols)] = depot_lookup(terminal_miles, bus_list, route_list, 'to_route')
+    if last:
+        cols, bus_list, route_list = zip(*last)
+        miles[list(cols)] = depot_lookup(terminal_miles, bus_list, route_list, 'from_route')
+    if arcs:
+        cols = [v for v, _, _ in arcs]
+        miles[cols] = [reposition_miles[(j, k)] for _, j, k in arcs]
+    return miles
+
+
+def _dominates(a, b, keys):
+    return all(a[k] <= b[k] + 1e-9 for k in keys) and any(a[k] < b[k] - 1e-9 for k in keys)
+
+
+def pareto_sweep(build_fn, build_kwargs, bus_caps=None, minimize='miles', time_limit=None):
+    """
+    Trade-off between the number of buses, reposition miles and (for the
+    S-IP) expected delay. One model is built and kept alive; the sweep walks
+    an epsilon-constraint grid on the bus count, minimizing miles or
+    expected delay, and only the bound of the bus cap row changes between
+    points. Caps are visited in increasing order so every point is
+    warm-started from the previous, still feasible, solution. With the
+    S-IP, each point is re-solved for the other criterion with the chosen
+    one held at its optimum, so the frontier only holds efficient points.
+    """
+    defaults = {name: param.default for name, param in inspect.signature(build_fn).parameters.items()}
+    e = build_kwargs.get('e', defaults['e'])
+    stochastic = 'scenario_probs' in build_kwargs
+    if minimize == 'delay' and not stochastic:
+        raise ValueError("Expected delay can only be minimized with the S-IP model")
+    if build_kwargs.get('lazy_timing'):
+        raise ValueError("The Pareto sweep needs the full S-IP model, build it without lazy_timing")
+
+    start = time.perf_counter()
+    model, var_mapping, var_index = build_fn(**build_kwargs)
+    build_time = time.perf_counter() - start
+    num_col = model.getNumCol()
+
+    # Per-column criteria
+    first_cols = np.array([v for v, key in var_mapping.items() if key[0] == 'y_i0j'], dtype=np.int32)
+    unserved = np.array([key[0] == 'x_j' for v, key in var_mapping.items()], dtype=np.float64)
+    miles = column_miles(var_mapping, build_kwargs['buses'], build_kwargs['routes'],
+                          build_kwargs['reposition_miles'], build_kwargs['terminal_miles'])
+    delay = np.zeros(num_col)
+    if stochastic:
+        scenario_probs = build_kwargs['scenario_probs']
+        for v, key in var_mapping.items():
+            if key[0] == 'delta':
+                delay[v] = scenario_probs[key[1]]
+
+    # Epsilon-constraint objective: covering routes first, then the chosen criterion
+    objective = e * unserved + (miles if minimize == 'miles' else delay)
+    secondary = delay if minimize == 'miles' else miles
+    all_cols = np.arange(num_col, dtype=np.int32)
+    model.changeColsCost(num_col, all_cols, objective)
+    if time_limit is not None:
+        model.setOptionValue("time_limit", float(time_limit))
+
+    # Bus cap row: sum of y_i0j <= cap
+    if bus_caps is None:
+        bus_caps = range(1, min(len(build_kwargs['buses']), len(build_kwargs['routes'])) + 1)
+    cap_row = model.getNumRow()
+    model.addRow(0.0, float(len(build_kwargs['buses'])), len(first_cols), first_cols,
+                 np.ones(len(first_cols)))
+
+    points = []
+    previous = None
+    for cap in sorted(bus_caps):
+        model.changeRowBounds(cap_row, 0.0, float(cap))
+        if previous is not None:
+            model.setSolution(previous)
+
+        solve_start = time.perf_counter()
+        model.run()
+        solve_time = time.perf_counter() - solve_start
+
+        status = model.getModelStatus()
+        if status != highspy.HighsModelStatus.kOptimal:
+            points.append({'bus_cap': cap, 'status': model.modelStatusToString(status),
+                           'solve_time': solve_time})
+            continue
+
+        previous = model.getSolution()
+        if stochastic:
+            # Lexicographic tie-break: among the optima of the chosen
+            # criterion, take the best value of the other one
+            primary = model.getObjectiveValue()
+            tie_row = model.getNumRow()
+            model.addRow(-highspy.kHighsInf, primary + 1e-6 * max(1.0, abs(primary)),
+                         num_col, all_cols, objective)
+            model.changeColsCost(num_col, all_cols, secondary)
+            model.setSolution(previous)
+            model.run()
+            if model.getModelStatus() == highspy.HighsModelStatus.kOptimal:
+                previous = model.getSolution()
+            model.deleteRows(1, np.array([tie_row], dtype=np.int32))
+            model.changeColsCost(num_col, all_cols, objective)
+            solve_time = time.perf_counter() - solve_start
+
+        values = np.asarray(previous.col_value)
+        solution = interpret_dip_solution(values, var_mapping, float(values @ objective))
+        points.append({
+            'bus_cap': cap,
+            'status': 'optimal',
+            'buses_used': int(round(values[first_cols].sum())),
+            'reposition_miles': float(values @ miles),
+            'expected_delay': float(values @ delay) if stochastic else None,
+            'unserved_routes': solution['unserved_routes'],
+            'bus_assignments': solution['bus_assignments'],
+            'objective_value': solution['objective_value'],
+            'solve_time': solve_time,
+        })
+
+    # Keep the non-dominated points
+    keys = ['num_unserved', 'buses_used', 'reposition_miles'] + (['expected_delay'] if stochastic else [])
+    solved = [dict(p, num_unserved=len(p['unserved_routes'])) for p in points if p['status'] == 'optimal']
+    frontier = [p for p in solved if not any(_dominates(q, p, keys) for q in solved)]
+    frontier = list({p['buses_used']: p for p in frontier}.values())
+    for p in frontier:
+        del p['num_unserved']
+
+    return {
+        'points': points,
+        'frontier': frontier,
+        'build_time': build_time,
+        'total_time': time.perf_counter() - start,
+    }
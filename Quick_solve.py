@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Lightweight entry point for short-lived worker processes: solve one
+instance directory and print the decoded result as JSON.
+
+    python Quick_solve.py Data --model dip --time-limit 60
+
+Only the cached binary instance (see Load_data.load_cached_instance),
+NumPy and highspy are loaded on the D-IP path; pandas is imported only
+when the cache has to be rebuilt.
+"""
+import argparse
+import json
+import sys
+import time
+from Load_data import load_cached_instance, load_instance
+from DIP_model import build_dip_model
+from Solve_DIP import solve_dip_model, solve_status
+
+
+def quick_solve(data_dir, model_type='dip', params=None, scenarios=None, time_limit=None, use_cache=True):
+    """
+    Load, build and solve one instance. Returns the decoded solution with
+    the time spent in each step.
+    """
+    timings = {}
+    start = time.perf_counter()
+    instance = load_cached_instance(data_dir) if use_cache else load_instance(data_dir)
+    timings['load_time'] = time.perf_counter() - start
+
+    build_kwargs = dict(instance, current_solution={'y_i0j': {}, 'y_ijk': {}, 'y_ij0': {}}, **(params or {}))
+    start = time.perf_counter()
+    if model_type == 'dip':
+        model, var_mapping, _ = build_dip_model(**build_kwargs)
+        timings['build_time'] = time.perf_counter() - start
+        start = time.perf_counter()
+        solution = solve_dip_model(model, var_mapping, time_limit=time_limit)
+    else:
+        # The S-IP path is only imported when asked for
+        from Load_data import scaled_scenarios
+        from SIP_model import build_sip_model
+        from Solve_SIP import solve_sip_model, solve_sip_model_lazy
+        scenarios = scenarios or {'S1': 0.9, 'S2': 1.0, 'S3': 1.2}
+        scenario_probs = {u: 1.0 / len(scenarios) for u in scenarios}
+        reposition_scenarios, terminal_scenarios = scaled_scenarios(instance, scenarios)
+        del build_kwargs['reposition_times'], build_kwargs['terminal_times']
+        model, var_mapping, _ = build_sip_model(reposition_scenarios=reposition_scenarios,
+                                                terminal_scenarios=terminal_scenarios,
+                                                scenario_probs=scenario_probs, **build_kwargs)
+        timings['build_time'] = time.perf_counter() - start
+        start = time.perf_counter()
+        if build_kwargs.get('lazy_timing'):
+            solution = solve_sip_model_lazy(model, var_mapping, list(scenarios), instance['routes'],
+                                            scenario_probs, reposition_scenarios, instance['route_end_times'],
+                                            instance['route_start_times'], time_limit=time_limit)
+        else:
+            solution = solve_sip_model(model, var_mapping, list(scenarios), instance['routes'], scenario_probs,
+                                       time_limit=time_limit)
+    timings['solve_time'] = time.perf_counter() - start
+
+    result = {'status': 'optimal' if solution is not None else 'not optimal'}
+    if solution is not None:
+        result.update({k: v for k, v in solution.items() if k != 'delays_by_scenario'})
+    else:
+        result.update(solve_status(model))
+    result.update(timings)
+    return result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Solve one instance directory and print the result as JSON")
+    parser.add_argument('instance', help="instance directory (see Data/instance.json)")
+    parser.add_argument('--model', choices=('dip', 'sip'), default='dip')
+    parser.add_argument('--params', default='{}', help="JSON object of model parameters, e.g. '{\"c\": 100}'")
+    parser.add_argument('--scenarios', default=None, help="JSON object of S-IP scenario scaling factors")
+    parser.add_argument('--time-limit', type=float, default=None, help="solver time limit in seconds")
+    parser.add_argument('--no-cache', action='store_true', help="parse the CSV tables instead of the cache")
+    args = parser.parse_args(argv)
+
+    result = quick_solve(args.instance, args.model, json.loads(args.params),
+                         json.loads(args.scenarios) if args.scenarios else None,
+                         args.time_limit, not args.no_cache)
+    json.dump(result, sys.stdout, default=float)
+    sys.stdout.write('\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import queue
+import shutil
+import tempfile
+import time
+import multiprocessing as mp
+import numpy as np
+import highspy
+
+# Differently configured HiGHS solves raced against each other by default
+DEFAULT_PORTFOLIO = [
+    {'random_seed': 0},
+    {'random_seed': 1, 'presolve': 'off'},
+    {'random_seed': 2, 'mip_heuristic_effort': 0.3},
+    {'random_seed': 3, 'mip_heuristic_effort': 0.01},
+]
+
+
+def _gap_closed(primal, dual, mip_rel_gap):
+    """
+    Check whether the shared primal and dual bounds prove optimality.
+    """
+    if primal == float('inf') or dual == -float('inf'):
+        return False
+    return primal - dual <= mip_rel_gap * max(abs(primal), 1e-9) + 1e-9
+
+
+def _race_worker(worker_id, model_path, options, time_limit, mip_rel_gap,
+                 lock, best_primal, best_dual, incumbent, incumbent_version,
+                 stop_event, results):
+    """
+    Solve the model with one portfolio configuration, sharing bounds and
+    incumbents with the other workers through shared memory.
+    """
+    # The parent may have left the HiGHS thread pool behind when forking
+    highspy.Highs.resetGlobalScheduler(True)
+
+    model = highspy.Highs()
+    model.setOptionValue("log_to_console", False)
+    model.readModel(model_path)
+    for name, value in options.items():
+        model.setOptionValue(name, value)
+    model.setOptionValue("mip_rel_gap", mip_rel_gap)
+    if time_limit is not None:
+        model.setOptionValue("time_limit", float(time_limit))
+
+    injected = {'version': 0}
+
+    def on_improving_solution(e):
+        # Publish a new incumbent if it beats every other worker
+        objective = e.data_out.objective_function_value
+        with lock:
+            if objective < best_primal.value:
+                best_primal.value = objective
+                incumbent[:] = e.data_out.mip_solution
+                incumbent_version.value += 1
+                injected['version'] = incumbent_version.value
+
+    def on_interrupt(e):
+        # Share the dual bound and stop once the race is decided
+        with lock:
+            if e.data_out.mip_dual_bound > best_dual.value:
+                best_dual.value = e.data_out.mip_dual_bound
+            primal, dual = best_primal.value, best_dual.value
+        if stop_event.is_set() or _gap_closed(primal, dual, mip_rel_gap):
+            e.interrupt()
+
+    def on_user_solution(e):
+        # Hand over an incumbent found by another worker
+        with lock:
+            if incumbent_version.value == injected['version']:
+                return
+            if best_primal.value >= e.data_out.mip_primal_bound:
+                return
+            injected['version'] = incumbent_version.value
+            solution = np.array(incumbent[:], dtype=np.float64)
+        e.data_in.setSolution(solution)
+
+    model.cbMipImprovingSolution.subscribe(on_improving_solution)
+    model.cbMipInterrupt.subscribe(on_interrupt)
+    model.cbMipUserSolution.subscribe(on_user_solution)
+
+    model.run()
+
+    status = model.getModelStatus()
+    results.put((
+        worker_id,
+        model.modelStatusToString(status),
+        status == highspy.HighsModelStatus.kOptimal,
+        status == highspy.HighsModelStatus.kInfeasible,
+        model.getObjectiveValue(),
+        np.array(model.getSolution().col_value, dtype=np.float64),
+    ))
+
+
+def race_solve(model, portfolio=None, time_limit=None, mip_rel_gap=1e-4, max_workers=None):
+    """
+    Race several differently configured HiGHS solves of the same model in
+    parallel processes. The first worker to prove optimality (or to close
+    the gap together with the bounds shared by the others) wins and the
+    remaining workers are cancelled.
+    """
+    if portfolio is None:
+        portfolio = DEFAULT_PORTFOLIO
+    
+    # Racing more configurations than there are cores only slows each one down
+    if max_workers is None:
+        max_workers = os.cpu_count() or 1
+    portfolio = portfolio[:max(1, max_workers)]
+
+    start = time.perf_counter()
+    num_col = model.getNumCol()
+
+    # Hand the model to the workers as an MPS file
+    work_dir = tempfile.mkdtemp(prefix='race_')
+    model_path = os.path.join(work_dir, 'model.mps')
+    model.writeModel(model_path)
+
+    # Fork like the other process pools of the repo: spawned workers would
+    # re-import the caller's unguarded __main__ (e.g. main.py)
+    ctx = mp.get_context('fork')
+    lock = ctx.Lock()
+    best_primal = ctx.RawValue('d', float('inf'))
+    best_dual = ctx.RawValue('d', -float('inf'))
+    incumbent = ctx.RawArray('d', num_col)
+    incumbent_version = ctx.RawValue('l', 0)
+    stop_event = ctx.Event()
+    results = ctx.Queue()
+
+    workers = []
+    for worker_id, options in enumerate(portfolio):
+        worker = ctx.Process(
+            target=_race_worker,
+            args=(worker_id, model_path, options, time_limit, mip_rel_gap,
+                  lock, best_primal, best_dual, incumbent, incumbent_version,
+                  stop_event, results),
+            daemon=True,
+        )
+        worker.start()
+        workers.append(worker)
+
+    outcome = {
+        'status': 'not solved',
+        'col_value': None,
+        'objective_value': None,
+        'winner': None,
+        'run_time': None,
+    }
+
+    try:
+        reported = set()
+        while len(reported) < len(workers):
+            try:
+                worker_id, status, optimal, infeasible, objective, col_value = results.get(timeout=0.1)
+            except queue.Empty:
+                # Stop waiting on workers that died without reporting. A
+                # worker flushes its result before exiting, so one last read
+                # picks up anything sent just before the check.
+                if any(worker.exitcode is None for n, worker in enumerate(workers) if n not in reported):
+                    continue
+                try:
+                    worker_id, status, optimal, infeasible, objective, col_value = results.get(timeout=0.5)
+                except queue.Empty:
+                    break
+            reported.add(worker_id)
+
+            if optimal:
+                outcome.update(status='optimal', col_value=col_value,
+                               objective_value=objective, winner=portfolio[worker_id])
+                break
+
+            if infeasible:
+                outcome.update(status='infeasible', winner=portfolio[worker_id])
+                break
+
+            # Interrupted because the shared bounds met: the shared incumbent is optimal
+            with lock:
+                primal, dual = best_primal.value, best_dual.value
+                shared = np.array(incumbent[:], dtype=np.float64)
+            if _gap_closed(primal, dual, mip_rel_gap):
+                outcome.update(status='optimal', col_value=shared,
+                               objective_value=primal, winner=portfolio[worker_id])
+                break
+
+            outcome['status'] = status
+
+        # No proof of optimality: fall back on the best shared incumbent
+        if outcome['status'] not in ('optimal', 'infeasible'):
+            with lock:
+                if best_primal.value < float('inf'):
+                    outcome.update(col_value=np.array(incumbent[:], dtype=np.float64),
+                                   objective_value=best_primal.value)
+    finally:
+        # Cancel the remaining workers
+        stop_event.set()
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+            worker.join()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    outcome['run_time'] = time.perf_counter() - start
+    return outcome
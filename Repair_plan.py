@@ -0,0 +1,211 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import time
+import numpy as np
+from DIP_model import build_dip_model
+from Solve_DIP import solve_dip_model
+from Terminal_depots import as_depot_table
+
+
+def _can_insert(route, chain, start_times, end_times, reposition_times, available_at, location=None):
+    """
+    Check whether route fits somewhere in the remaining chain of a bus that
+    is at location (None for its depot) from time available_at.
+    """
+    stops = [location] + list(chain) + [None]
+    for prev, nxt in zip(stops[:-1], stops[1:]):
+        if prev is None:
+            ready = available_at
+        else:
+            ready = end_times[prev] + reposition_times[(prev, route)]
+        if ready > start_times[route]:
+            continue
+        if nxt is None or end_times[route] + reposition_times[(route, nxt)] <= start_times[nxt]:
+            return True
+    return False
+
+
+def repair_plan(
+    bus_assignments, current_time, buses, routes, route_loads, route_wc_loads,
+    bus_capacities, bus_wc_capacities, route_durations, route_end_times, route_start_times,
+    reposition_miles, reposition_times, terminal_miles, terminal_times,
+    broken_buses=(), late_routes=None, max_chain_buses=10, c=100, e=1000, r=1, **dip_params
+):
+    """
+    Repair a bus plan after a same-day disruption (broken buses and/or late
+    routes, given as route -> delay in minutes) without re-solving the
+    whole day. Routes that have already started are frozen, and only a
+    small neighbourhood is re-optimized with the D-IP model: the affected
+    routes, spare buses and buses whose remaining chains have slack for
+    them. The result is returned as a diff against the current plan.
+    """
+    start = time.perf_counter()
+    late_routes = late_routes or {}
+    broken_buses = set(broken_buses)
+    terminal_miles = as_depot_table(buses, routes, terminal_miles)
+    terminal_times = as_depot_table(buses, routes, terminal_times)
+
+    # Late routes shift their start and end times
+    start_times = {j: route_start_times[j] + late_routes.get(j, 0) for j in routes}
+    end_times = {j: route_end_times[j] + late_routes.get(j, 0) for j in routes}
+
+    # Split every chain into a frozen part (already started) and the rest
+    frozen, remaining = {}, {}
+    for i, chain in bus_assignments.items():
+        frozen[i] = [j for j in chain if route_start_times[j] <= current_time]
+        remaining[i] = [j for j in chain if route_start_times[j] > current_time]
+
+    # Routes that lost their bus or can no longer be reached in time
+    affected = []
+    for i, chain in remaining.items():
+        if i in broken_buses:
+            affected.extend(chain)
+            continue
+        stops = frozen[i][-1:] + chain
+        for prev, nxt in zip(stops[:-1], stops[1:]):
+            if end_times[prev] + reposition_times[(prev, nxt)] > start_times[nxt]:
+                affected.extend(chain[chain.index(nxt):])
+                break
+    affected = list(dict.fromkeys(affected))
+
+    if not affected:
+        return {
+            'bus_assignments': {i: list(chain) for i, chain in bus_assignments.items()},
+            'reassigned_routes': {},
+            'unserved_routes': [],
+            'added_buses': [],
+            'released_buses': [],
+            'neighbourhood': {'buses': [], 'routes': []},
+            'run_time': time.perf_counter() - start,
+        }
+
+    # Neighbourhood: spare buses, buses whose own chains were cut, and the
+    # chains with the most room for the affected routes
+    spare_buses = [i for i in buses if i not in bus_assignments and i not in broken_buses]
+    cut_buses = [i for i, chain in remaining.items()
+                 if i not in broken_buses and any(j in affected for j in chain)]
+    slack_counts = {}
+    for i, chain in remaining.items():
+        if i in broken_buses or i in cut_buses:
+            continue
+        location = frozen[i][-1] if frozen[i] else None
+        slack_counts[i] = sum(_can_insert(j, chain, start_times, end_times, reposition_times,
+                                          current_time, location) for j in affected)
+    slack_buses = sorted((i for i in slack_counts if slack_counts[i] > 0), key=lambda i: -slack_counts[i])
+    chain_buses = cut_buses + slack_buses[:max_chain_buses]
+
+    sub_buses = chain_buses + spare_buses
+    sub_routes = list(dict.fromkeys(affected + [j for i in chain_buses for j in remaining[i]]))
+
+    # Every bus starts from its own position: the end of its last frozen route
+    # or its depot. With p = current_time, constraint (A.9) then enforces
+    # p + t <= start, i.e. the bus can reach the route in time.
+    route_pos = {j: n for n, j in enumerate(terminal_miles['routes'])}
+    sub_cols = [route_pos[j] for j in sub_routes]
+    miles_out, miles_back, times_out, times_back = [], [], [], []
+    for i in sub_buses:
+        d_miles = terminal_miles['bus_depot'][i]
+        d_times = terminal_times['bus_depot'][i]
+        location = frozen.get(i, [])[-1:]
+        if location:
+            last = location[0]
+            miles_out.append([reposition_miles[(last, j)] for j in sub_routes])
+            times_out.append([end_times[last] + reposition_times[(last, j)] - current_time for j in sub_routes])
+        else:
+            miles_out.append(terminal_miles['to_route'][d_miles, sub_cols])
+            times_out.append(terminal_times['to_route'][d_times, sub_cols])
+        miles_back.append(terminal_miles['from_route'][d_miles, sub_cols])
+        times_back.append(terminal_times['from_route'][d_times, sub_cols])
+
+    sub_miles = {
+        'depots': list(sub_buses),
+        'bus_depot': {i: n for n, i in enumerate(sub_buses)},
+        'routes': sub_routes,
+        'to_route': np.array(miles_out, dtype=np.float64),
+        'from_route': np.array(miles_back, dtype=np.float64),
+    }
+    sub_times = dict(sub_miles, to_route=np.array(times_out, dtype=np.float64),
+                     from_route=np.array(times_back, dtype=np.float64))
+
+    model, var_mapping, var_index = build_dip_model(
+        buses=sub_buses,
+        routes=sub_routes,
+        route_loads=route_loads,
+        route_wc_loads=route_wc_loads,
+        bus_capacities=bus_capacities,
+        bus_wc_capacities=bus_wc_capacities,
+        route_durations=route_durations,
+        route_end_times=end_times,
+        route_start_times=start_times,
+        reposition_miles=reposition_miles,
+        reposition_times=reposition_times,
+        terminal_miles=sub_miles,
+        terminal_times=sub_times,
+        current_solution={},
+        c=c, e=e, r=r, p=current_time,
+        **dip_params
+    )
+
+    # Buses already on the road cost nothing extra to keep using
+    active_cols = [v for key, v in var_index.items() if key[0] == 'y_i0j' and key[1] in chain_buses]
+    if active_cols:
+        costs = np.array(model.getLp().col_cost_)[active_cols] - c
+        model.changeColsCost(len(active_cols), np.array(active_cols, dtype=np.int32), costs)
+
+    solution = solve_dip_model(model, var_mapping)
+    if solution is None:
+        return None
+
+    # Merge the repaired neighbourhood back into the plan
+    new_plan = {}
+    for i, chain in bus_assignments.items():
+        if i in broken_buses or i in chain_buses:
+            new_plan[i] = list(frozen[i])
+        else:
+            new_plan[i] = list(chain)
+    for i, chain in solution['bus_assignments'].items():
+        new_plan[i] = new_plan.get(i, []) + chain
+    new_plan = {i: chain for i, chain in new_plan.items() if chain}
+
+    old_bus = {j: i for i, chain in bus_assignments.items() for j in chain}
+    new_bus = {j: i for i, chain in new_plan.items() for j in chain}
+
+    return {
+        'bus_assignments': new_plan,
+        'reassigned_routes': {j: (old_bus.get(j), new_bus[j]) for j in new_bus if old_bus.get(j) != new_bus[j]},
+        'unserved_routes': list(solution['unserved_routes']),
+        'added_buses': [i for i in new_plan if i not in bus_assignments],
+        'released_buses': [i for i in bus_assignments if i not in new_plan],
+        'neighbourhood': {'buses': sub_buses, 'routes': sub_routes},
+        'run_time': time.perf_counter() - start,
+    }
+
+
+def check_last_route_repair(data_dir):
+    """
+    Self-check on an instance directory: break the bus whose chain ends
+    last just before its last route, then break a bus whose plan is a
+    single route. In both cases the repair neighbourhood has one route,
+    which must be moved to another bus or reported unserved.
+    """
+    from Load_data import load_cached_instance
+    from Quick_solve import quick_solve
+    instance = load_cached_instance(data_dir)
+    plan = quick_solve(data_dir)['bus_assignments']
+
+    bus = max(plan, key=lambda i: instance['route_start_times'][plan[i][-1]])
+    last = plan[bus][-1]
+    cases = [(plan, instance['route_start_times'][last] - 1), ({bus: [last]}, 0)]
+    for bus_assignments, current_time in cases:
+        repair = repair_plan(bus_assignments, current_time, broken_buses=[bus], **instance)
+        assert repair is not None, f"Repair of {bus} at {current_time} did not solve"
+        assert repair['neighbourhood']['routes'] == [last]
+        assert last not in repair['bus_assignments'].get(bus, [])
+        assert last in repair['unserved_routes'] or repair['reassigned_routes'][last][0] == bus
+    return last
+
+
+if __name__ == '__main__':
+    import sys
+    route = check_last_route_repair(sys.argv[1] if len(sys.argv) > 1 else 'Data')
+    print(f"Repaired the last route {route} of a broken bus")
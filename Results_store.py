@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import glob
+import json
+import os
+import time
+import uuid
+import numpy as np
+from Check_solution import plan_arrays, bus_miles
+
+# Parquet needs pyarrow; without it the tables are stored as .npz parts
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
+
+# A results store is a directory with one sub-directory per table. Every
+# write appends one part file per table; parts are never rewritten.
+# Names (runs, buses, routes, scenarios) are stored as strings.
+SCHEMA = {
+    'runs': {'run_id': str, 'created': np.float64, 'objective_value': np.float64,
+             'num_unserved': np.int64, 'buses_used': np.int64, 'total_miles': np.float64,
+             'expected_delay': np.float64, 'metadata': str},
+    'assignments': {'run_id': str, 'bus': str, 'position': np.int64, 'route': str},
+    'delays': {'run_id': str, 'scenario': str, 'route': str, 'delay': np.float64},
+    'bus_miles': {'run_id': str, 'bus': str, 'miles': np.float64},
+}
+
+
+def _run_columns(run_id, solution, instance, metadata):
+    """
+    Columns of every table for one solved run.
+    """
+    chains = solution['bus_assignments']
+    buses = [i for i, chain in chains.items() for _ in chain]
+    assignments = {
+        'bus': buses,
+        'position': [n for chain in chains.values() for n in range(len(chain))],
+        'route': [j for chain in chains.values() for j in chain],
+    }
+
+    delays_by_scenario = solution.get('delays_by_scenario', {})
+    delays = {
+        'scenario': [u for u, delays in delays_by_scenario.items() for _ in delays],
+        'route': [j for delays in delays_by_scenario.values() for j in delays],
+        'delay': np.fromiter((d for delays in delays_by_scenario.values() for d in delays.values()),
+                             dtype=np.float64),
+    }
+
+    miles = {'bus': [], 'miles': np.zeros(0)}
+    if instance is not None:
+        route_bus, successors = plan_arrays(chains, instance)
+        per_bus = bus_miles(route_bus, successors, instance)
+        used = np.flatnonzero(np.bincount(route_bus[route_bus >= 0], minlength=len(instance['buses'])))
+        miles = {'bus': [instance['buses'][n] for n in used], 'miles': per_bus[used]}
+
+    expected_delays = solution.get('expected_delays')
+    runs = {
+        'created': [time.time()],
+        'objective_value': [solution['objective_value']],
+        'num_unserved': [len(solution['unserved_routes'])],
+        'buses_used': [len(chains)],
+        'total_miles': [float(miles['miles'].sum()) if instance is not None else np.nan],
+        'expected_delay': [float(sum(expected_delays.values())) if expected_delays else np.nan],
+        'metadata': [json.dumps(metadata or {}, sort_keys=True, default=str)],
+    }
+
+    columns = {'runs': runs, 'assignments': assignments, 'delays': delays, 'bus_miles': miles}
+    for table in columns.values():
+        length = len(next(iter(table.values())))
+        table['run_id'] = [run_id] * length
+    return columns
+
+
+def _as_array(values, dtype):
+    # Strings are stored fixed-width, never as Python objects
+    if dtype is str:
+        return np.array([str(value) for value in values], dtype=np.str_)
+    return np.asarray(values, dtype=dtype)
+
+
+def write_runs(store_dir, runs, instance=None, fmt=None):
+    """
+    Append a batch of solved runs to the store in one bulk write: one part
+    file per table. runs is a list of (solution, metadata) pairs, where a
+    solution is the dict returned by solve_dip_model / solve_sip_model.
+    Per-bus miles need the instance arrays of Check_solution.instance_arrays.
+    Returns the run ids.
+    """
+    fmt = fmt or ('parquet' if pa is not None else 'npz')
+    if fmt == 'parquet' and pa is None:
+        raise ImportError("Writing parquet needs pyarrow")
+
+    run_ids = []
+    batches = {table: [] for table in SCHEMA}
+    for solution, metadata in runs:
+        run_id = (metadata or {}).get('run_id') or uuid.uuid4().hex
+        run_ids.append(run_id)
+        for table, columns in _run_columns(run_id, solution, instance, metadata).items():
+            batches[table].append(columns)
+
+    # Part names sort in write order
+    part = f'{time.time_ns():020d}-{uuid.uuid4().hex[:8]}'
+    for table, batch in batches.items():
+        columns = {name: _as_array([value for columns in batch for value in columns[name]], dtype)
+                   for name, dtype in SCHEMA[table].items()}
+        table_dir = os.path.join(store_dir, table)
+        os.makedirs(table_dir, exist_ok=True)
+        path = os.path.join(table_dir, f'part-{part}.{fmt}')
+        tmp_path = path + '.tmp'
+        if fmt == 'parquet':
+            pq.write_table(pa.table(columns), tmp_path)
+        else:
+            with open(tmp_path, 'wb') as f:
+                np.savez(f, **columns)
+        os.replace(tmp_path, path)
+    return run_ids
+
+
+def write_run(store_dir, solution, instance=None, metadata=None, fmt=None):
+    """
+    Append a single run to the store. Returns its run id.
+    """
+    return write_runs(store_dir, [(solution, metadata)], instance, fmt)[0]
+
+
+def iter_table(store_dir, table, columns=None):
+    """
+    Iterate over the parts of a table, one dict of NumPy arrays per part.
+    Only the requested columns are read from disk.
+    """
+    for path in sorted(glob.glob(os.path.join(store_dir, table, 'part-*.*'))):
+        if path.endswith('.npz'):
+            with np.load(path, allow_pickle=False) as part:
+                yield {name: part[name] for name in (columns or part.files)}
+        elif path.endswith('.parquet'):
+            if pq is None:
+                raise ImportError(f"Reading {path} needs pyarrow")
+            part = pq.read_table(path, columns=columns)
+            yield {name: _as_array(part.column(name).to_numpy(zero_copy_only=False), SCHEMA[table][name])
+                   for name in part.column_names}
+
+
+def read_table(store_dir, table, columns=None):
+    """
+    Read the requested columns of a table over all parts into one dict of
+    NumPy arrays.
+    """
+    parts = list(iter_table(store_dir, table, columns))
+    if not parts:
+        return {name: _as_array([], dtype) for name, dtype in SCHEMA[table].items()
+                if columns is None or name in columns}
+    return {name: np.concatenate([part[name] for part in parts]) for name in parts[0]}
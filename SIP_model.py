@@ -2,7 +2,112 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import highspy
-import pandas as pd
+from Terminal_depots import as_depot_table, depot_lookup
+from Symmetry import bus_orbits, add_symmetry_breaking
+
+def reposition_tensor(reposition_scenarios, scenarios, routes):
+    """
+    Convert per-scenario dictionaries of reposition times into a
+    (U x R x R) array. Missing pairs (including j == k) are infinite.
+    A tensor passed in is returned unchanged.
+    """
+    if isinstance(reposition_scenarios, np.ndarray):
+        return reposition_scenarios
+    
+    route_pos = {j: n for n, j in enumerate(routes)}
+    tensor = np.full((len(scenarios), len(routes), len(routes)), np.inf)
+    for n_u, u in enumerate(scenarios):
+        times = reposition_scenarios[u]
+        if not times:
+            continue
+        pairs = [(route_pos[j], route_pos[k]) for j, k in times if j in route_pos and k in route_pos]
+        values = [times[(j, k)] for j, k in times if j in route_pos and k in route_pos]
+        if not pairs:
+            # No pair among the given routes, e.g. a route subset
+            continue
+        rows, cols = zip(*pairs)
+        tensor[n_u, list(rows), list(cols)] = values
+    return tensor
+
+def _add_row_block(model, lower, upper, indices, values):
+    """
+    Add a block of rows that all have the same number of nonzeros, given as
+    (rows x nonzeros) index and value arrays.
+    """
+    num_rows, row_nnz = indices.shape
+    starts = np.arange(num_rows, dtype=np.int32) * row_nnz
+    model.addRows(num_rows, lower, upper, num_rows * row_nnz, starts,
+                  indices.astype(np.int32).ravel(), values.astype(np.float64).ravel())
+
+def _add_timing_rows(model, scenario_idx, arc_idx, arc_cols, arc_prev, arc_next,
+                     rep_tensor, T_start, R, M):
+    """
+    Add the (B.6) start time rows for the given (scenario, arc) pairs:
+    T_j^u - T_k^u + (M - t_kj^u) y_ikj >= -M.
+    """
+    prev, nxt = arc_prev[arc_idx], arc_next[arc_idx]
+    indices = np.column_stack([
+        T_start + scenario_idx * R + nxt,
+        T_start + scenario_idx * R + prev,
+        arc_cols[arc_idx],
+    ])
+    values = np.column_stack([
+        np.ones(len(arc_idx)),
+        -np.ones(len(arc_idx)),
+        M - rep_tensor[scenario_idx, prev, nxt],
+    ])
+    _add_row_block(model, np.full(len(arc_idx), -M), np.full(len(arc_idx), highspy.kHighsInf),
+                   indices, values)
+
+def _timing_core(rep_tensor, arc_prev, arc_next, end_times, start_times):
+    """
+    (U x arcs) mask of the (B.6) rows kept in the model up front in lazy
+    mode: arcs on which the reposition can push the next start past its
+    schedule in that scenario.
+    """
+    return end_times[arc_prev] + rep_tensor[:, arc_prev, arc_next] > start_times[arc_next]
+
+def sip_timing_rows(var_mapping, scenarios, routes, reposition_scenarios,
+                    route_end_times, route_start_times):
+    """
+    Collect the data behind the (B.6) start time rows of a built S-IP
+    model, so that they can be checked and added lazily.
+    """
+    route_pos = {j: n for n, j in enumerate(routes)}
+    arc_cols, arc_prev, arc_next = [], [], []
+    T_start = None
+    for v, key in var_mapping.items():
+        if key[0] == 'y_ijk':
+            arc_cols.append(v)
+            arc_prev.append(route_pos[key[2]])
+            arc_next.append(route_pos[key[3]])
+        elif key[0] == 'T' and T_start is None:
+            T_start = v
+    
+    arc_prev = np.array(arc_prev, dtype=np.int64)
+    arc_next = np.array(arc_next, dtype=np.int64)
+    rep_tensor = reposition_tensor(reposition_scenarios, scenarios, routes)
+    end_times = np.array([route_end_times[j] for j in routes], dtype=np.float64)
+    start_times = np.array([route_start_times[j] for j in routes], dtype=np.float64)
+    
+    return {
+        'arc_cols': np.array(arc_cols, dtype=np.int64),
+        'arc_prev': arc_prev,
+        'arc_next': arc_next,
+        'rep_tensor': rep_tensor,
+        'T_start': T_start,
+        'num_routes': len(routes),
+        'M': max(route_end_times.values()) * 2,
+        'core': _timing_core(rep_tensor, arc_prev, arc_next, end_times, start_times),
+    }
+
+def add_sip_timing_rows(model, timing, scenario_idx, arc_idx):
+    """
+    Add the (B.6) rows of the given (scenario, arc) pairs to the model.
+    """
+    _add_timing_rows(model, scenario_idx, arc_idx, timing['arc_cols'], timing['arc_prev'],
+                     timing['arc_next'], timing['rep_tensor'], timing['T_start'],
+                     timing['num_routes'], timing['M'])
 
 def build_sip_model(
     # Input data
@@ -15,11 +120,11 @@ def build_sip_model(
     route_durations,       # Duration of each route
     route_end_times,       # End time of each route
     route_start_times,     # Start time of each route (added for realism)
-    reposition_scenarios,  # Dictionary of reposition times for each scenario
+    reposition_scenarios,  # Reposition times per scenario, dict or (U x R x R) array
     scenario_probs,        # Probability of each scenario
-    terminal_scenarios,    # Dictionary of terminal times for each scenario
+    terminal_scenarios,    # Depot table of terminal times for each scenario
     reposition_miles,      # Dictionary of reposition miles between routes
-    terminal_miles,        # Dictionary of miles from terminal to route and back
+    terminal_miles,        # Depot table of miles from terminal to route and back
     current_solution,      # Current bus-route assignments
     # Parameters
     c=100,                 # Penalty for using a bus
@@ -32,6 +137,8 @@ def build_sip_model(
     w=0,                   # Lower bound on slack time (optional)
     w_bar=300,             # Upper bound on slack time (optional)
     p=None,                # Earliest departure time from terminals (optional)
+    lazy_timing=False,     # Leave non-core (B.6) rows to solve_sip_model_lazy
+    symmetry_breaking=False,  # Order interchangeable buses (see Symmetry.py)
 ):
     """
     Build the Stochastic Integer Programming model for bus-route assignment
@@ -44,6 +151,9 @@ def build_sip_model(
     # Get the set of scenarios
     scenarios = list(scenario_probs.keys())
     
+    # Terminal costs are looked up per depot rather than per bus
+    terminal_miles = as_depot_table(buses, routes, terminal_miles)
+    
     # Preprocessing: Determine feasible bus-route assignments
     F_ij = {}  # Capacity feasibility
     F_ijk = {} # Time and capacity feasibility
@@ -54,26 +164,27 @@ def build_sip_model(
             F_ij[(i, j)] = (bus_capacities[i] >= route_loads[j] and 
                            bus_wc_capacities[i] >= route_wc_loads[j])
     
-    # Check time feasibility for consecutive routes (at least one scenario)
+    # Scenario reposition times as a (U x R x R) tensor
+    rep_tensor = reposition_tensor(reposition_scenarios, scenarios, routes)
+    end_times = np.array([route_end_times[j] for j in routes], dtype=np.float64)
+    start_times = np.array([route_start_times[j] for j in routes], dtype=np.float64)
+    
+    # Check time feasibility for consecutive routes (at least one scenario):
+    # the buffer grows with the reposition time, so the fastest scenario decides
+    buffer_times = ((1 + beta) * rep_tensor.min(axis=0)) + alpha
+    arc_feasible = end_times[:, None] + buffer_times <= start_times[None, :]
+    np.fill_diagonal(arc_feasible, False)
+    
+    # A feasible arc needs a reposition time in every scenario
+    missing = np.argwhere(arc_feasible[None, :, :] & np.isinf(rep_tensor))
+    if len(missing):
+        n_u, n_j, n_k = missing[0]
+        raise KeyError(f"No reposition time for ({routes[n_j]}, {routes[n_k]}) in scenario {scenarios[n_u]}")
+    
     for i in buses:
-        for j in routes:
-            for k in routes:
-                if j != k and F_ij[(i, j)] and F_ij[(i, k)]:
-                    feasible_in_any_scenario = False
-                    
-                    for u in scenarios:
-                        # Calculate buffer for reposition time
-                        buffer_time = ((1 + beta) * reposition_scenarios[u][(j, k)]) + alpha
-                        
-                        # Check if there's enough time to travel from j to k in this scenario
-                        # Using start times for more realism
-                        if route_end_times[j] + buffer_time <= route_start_times[k]:
-                            feasible_in_any_scenario = True
-                            break
-                    
-                    F_ijk[(i, j, k)] = feasible_in_any_scenario
-                else:
-                    F_ijk[(i, j, k)] = False
+        for n_j, j in enumerate(routes):
+            for n_k, k in enumerate(routes):
+                F_ijk[(i, j, k)] = bool(arc_feasible[n_j, n_k] and F_ij[(i, j)] and F_ij[(i, k)])
     
     # Define decision variables
     # y_i0j = 1 if bus i serves route j first
@@ -89,10 +200,18 @@ def build_sip_model(
     var_index = {}
     var_count = 0
     
+    # Columns of each variable type, for vectorized cost lookups
+    first_cols, first_buses, first_routes = [], [], []
+    arc_cols, arc_from, arc_to = [], [], []
+    last_cols, last_buses, last_routes = [], [], []
+    
     # Variables y_i0j (bus i serves route j first)
     for i in buses:
         for j in routes:
             if F_ij[(i, j)]:
+                first_cols.append(var_count)
+                first_buses.append(i)
+                first_routes.append(j)
                 var_mapping[var_count] = ('y_i0j', i, j)
                 var_index[('y_i0j', i, j)] = var_count
                 var_count += 1
@@ -102,6 +221,9 @@ def build_sip_model(
         for j in routes:
             for k in routes:
                 if j != k and F_ijk[(i, j, k)]:
+                    arc_cols.append(var_count)
+                    arc_from.append(j)
+                    arc_to.append(k)
                     var_mapping[var_count] = ('y_ijk', i, j, k)
                     var_index[('y_ijk', i, j, k)] = var_count
                     var_count += 1
@@ -110,6 +232,9 @@ def build_sip_model(
     for i in buses:
         for j in routes:
             if F_ij[(i, j)]:
+                last_cols.append(var_count)
+                last_buses.append(i)
+                last_routes.append(j)
                 var_mapping[var_count] = ('y_ij0', i, j)
                 var_index[('y_ij0', i, j)] = var_count
                 var_count += 1
@@ -121,6 +246,8 @@ def build_sip_model(
         var_count += 1
     
     # Variables T_j^u (start time of route j in scenario u)
+    num_binary = var_count
+    T_start = var_count
     for u in scenarios:
         for j in routes:
             var_mapping[var_count] = ('T', u, j)
@@ -128,6 +255,7 @@ def build_sip_model(
             var_count += 1
     
     # Variables T'_j^u (end time of route j in scenario u)
+    T_prime_start = var_count
     for u in scenarios:
         for j in routes:
             var_mapping[var_count] = ('T_prime', u, j)
@@ -135,6 +263,7 @@ def build_sip_model(
             var_count += 1
     
     # Variables delta_j^u (delay at the end of route j in scenario u)
+    delta_start = var_count
     for u in scenarios:
         for j in routes:
             var_mapping[var_count] = ('delta', u, j)
@@ -147,10 +276,7 @@ def build_sip_model(
     col_upper = np.ones(var_count)  # Default upper bound
     
     # Set binary variables bounds
-    for v in range(var_count):
-        var_type = var_mapping[v][0]
-        if var_type in ['T', 'T_prime', 'delta']:
-            col_upper[v] = inf  # Continuous variables can be any positive value
+    col_upper[num_binary:] = inf  # Continuous variables can be any positive value
     
     # Define objective function components
     obj_comp1 = np.zeros(var_count)  # Penalty for using a bus
@@ -171,16 +297,10 @@ def build_sip_model(
             obj_comp2[v] = e
     
     # Component 3: Penalty for reposition miles
-    for v in range(var_count):
-        if var_mapping[v][0] == 'y_i0j':
-            i, j = var_mapping[v][1], var_mapping[v][2]
-            obj_comp3[v] = r * terminal_miles[('terminal', i, j)]
-        elif var_mapping[v][0] == 'y_ij0':
-            i, j = var_mapping[v][1], var_mapping[v][2]
-            obj_comp3[v] = r * terminal_miles[(j, 'terminal', i)]
-        elif var_mapping[v][0] == 'y_ijk':
-            _, i, j, k = var_mapping[v]
-            obj_comp3[v] = r * reposition_miles[(j, k)]
+    obj_comp3[first_cols] = r * depot_lookup(terminal_miles, first_buses, first_routes, 'to_route')
+    obj_comp3[last_cols] = r * depot_lookup(terminal_miles, last_buses, last_routes, 'from_route')
+    obj_comp3[arc_cols] = r * np.fromiter((reposition_miles[(j, k)] for j, k in zip(arc_from, arc_to)),
+                                          dtype=np.float64, count=len(arc_cols))
     
     # Component 4: Penalty for deviating from current solution
     current_y_i0j = current_solution.get('y_i0j', {})
@@ -202,10 +322,8 @@ def build_sip_model(
                 obj_comp4[v] = -v
     
     # Component 5: Penalty for expected delay
-    for v in range(var_count):
-        if var_mapping[v][0] == 'delta':
-            u, j = var_mapping[v][1], var_mapping[v][2]
-            obj_comp5[v] = ell * scenario_probs[u]
+    probs = np.array([scenario_probs[u] for u in scenarios], dtype=np.float64)
+    obj_comp5[delta_start:] = ell * np.repeat(probs, len(routes))
     
     # Combine all objective components
     objective = obj_comp1 + obj_comp2 + obj_comp3 + obj_comp4 + obj_comp5
@@ -214,16 +332,13 @@ def build_sip_model(
     model.addVars(var_count, col_lower, col_upper)
     
     # Set variable types
-    for i in range(var_count):
-        var_type = var_mapping[i][0]
-        if var_type in ['y_i0j', 'y_ijk', 'y_ij0', 'x_j']:
-            model.changeColIntegrality(i, highspy.HighsVarType.kInteger)
-        else:
-            model.changeColIntegrality(i, highspy.HighsVarType.kContinuous)
+    all_cols = np.arange(var_count, dtype=np.int32)
+    integrality = np.full(var_count, highspy.HighsVarType.kContinuous)
+    integrality[:num_binary] = highspy.HighsVarType.kInteger
+    model.changeColsIntegrality(var_count, all_cols, integrality)
     
     # Set objective coefficients
-    for i in range(var_count):
-        model.changeColCost(i, objective[i])
+    model.changeColsCost(var_count, all_cols, objective)
     
     # Set the objective sense to minimize
     model.changeObjectiveSense(highspy.ObjSense.kMinimize)
@@ -301,73 +416,68 @@ def build_sip_model(
         values_np = np.array(values, dtype=np.float64)
         model.addRow(1.0, 1.0, len(indices_np), indices_np, values_np)
     
+    # Ordering constraints within groups of interchangeable buses; buses
+    # rewarded for keeping their current routes are not interchangeable
+    if symmetry_breaking:
+        pinned = {key[0] for part in current_solution.values() for key, value in part.items() if value == 1}
+        orbits = bus_orbits(buses, routes, bus_capacities, bus_wc_capacities,
+                            [terminal_miles] + [terminal_scenarios[u] for u in scenarios], pinned)
+        add_symmetry_breaking(model, var_index, orbits, routes)
+    
     # Large value for big-M constraints
     M = max(route_end_times.values()) * 2
     
-    # Constraints (B.5) and (B.6): Start time tracking
-    for u in scenarios:
-        for j in routes:
-            # Constraint (B.5): Start time if j is served first
-            indices = [var_index[('T', u, j)]]
-            values = [(route_end_times[j] - route_durations[j])]
-            
-            # Add indicators for buses serving route j first
-            for i in buses:
-                if F_ij[(i, j)] and ('y_i0j', i, j) in var_index:
-                    indices.append(var_index[('y_i0j', i, j)])
-                    values.append(-M)
-            
-            indices_np = np.array(indices, dtype=np.int32)
-            values_np = np.array(values, dtype=np.float64)
-            model.addRow(route_end_times[j] - route_durations[j] - M, inf, len(indices_np), indices_np, values_np)
-            
-            # For each potential previous route
-            for k in routes:
-                if k != j:
-                    # Constraint (B.6): Start time if j is served after k
-                    for i in buses:
-                        if F_ijk[(i, k, j)] and ('y_ijk', i, k, j) in var_index:
-                            indices = [
-                                var_index[('T', u, j)],
-                                var_index[('T', u, k)],
-                                var_index[('y_ijk', i, k, j)]
-                            ]
-                            values = [
-                                1.0,
-                                -1.0,
-                                M - reposition_scenarios[u][(k, j)]
-                            ]
-                            
-                            indices_np = np.array(indices, dtype=np.int32)
-                            values_np = np.array(values, dtype=np.float64)
-                            model.addRow(-M, inf, len(indices_np), indices_np, values_np)
+    # Row blocks below are assembled in CSR form, one row per (scenario, route)
+    # or (scenario, arc), and added to the model in bulk
+    U, R = len(scenarios), len(routes)
+    route_pos = {j: n for n, j in enumerate(routes)}
+    durations = np.array([route_durations[j] for j in routes], dtype=np.float64)
+    scheduled_starts = end_times - durations
+    T_cols = T_start + np.arange(U * R)
+    T_prime_cols = T_prime_start + np.arange(U * R)
+    delta_cols = delta_start + np.arange(U * R)
+    
+    # Constraint (B.5): Start time if j is served first
+    first_route_idx = np.array([route_pos[j] for j in first_routes], dtype=np.int64)
+    first_by_route = np.array(first_cols, dtype=np.int64)[np.argsort(first_route_idx, kind='stable')]
+    row_lengths = np.tile(1 + np.bincount(first_route_idx, minlength=R), U)
+    starts = np.concatenate(([0], np.cumsum(row_lengths)[:-1]))
+    indices = np.empty(row_lengths.sum(), dtype=np.int32)
+    values = np.full(row_lengths.sum(), -M, dtype=np.float64)
+    is_y = np.ones(row_lengths.sum(), dtype=bool)
+    is_y[starts] = False
+    indices[starts] = T_cols
+    values[starts] = np.tile(scheduled_starts, U)
+    indices[is_y] = np.tile(first_by_route, U)
+    model.addRows(U * R, np.tile(scheduled_starts - M, U), np.full(U * R, inf),
+                  len(indices), starts.astype(np.int32), indices, values)
+    
+    # Constraint (B.6): Start time if j is served after k
+    arc_prev = np.array([route_pos[k] for k in arc_from], dtype=np.int64)
+    arc_next = np.array([route_pos[j] for j in arc_to], dtype=np.int64)
+    if lazy_timing:
+        # Only the core rows go in up front, the rest are generated when violated
+        scenario_idx, arc_idx = np.nonzero(_timing_core(rep_tensor, arc_prev, arc_next, end_times, start_times))
+    else:
+        scenario_idx = np.repeat(np.arange(U), len(arc_cols))
+        arc_idx = np.tile(np.arange(len(arc_cols)), U)
+    _add_timing_rows(model, scenario_idx, arc_idx, np.array(arc_cols, dtype=np.int64),
+                     arc_prev, arc_next, rep_tensor, T_start, R, M)
     
     # Constraint (B.7): End time is at least scheduled end time
-    for u in scenarios:
-        for j in routes:
-            indices_np = np.array([var_index[('T_prime', u, j)]], dtype=np.int32)
-            values_np = np.array([1.0], dtype=np.float64)
-            model.addRow(route_end_times[j], inf, 1, indices_np, values_np)
+    _add_row_block(model, np.tile(end_times, U), np.full(U * R, inf),
+                   T_prime_cols[:, None], np.ones((U * R, 1)))
     
     # Constraint (B.8): End time is at least start time plus duration
-    for u in scenarios:
-        for j in routes:
-            indices_np = np.array([var_index[('T_prime', u, j)], var_index[('T', u, j)]], dtype=np.int32)
-            values_np = np.array([1.0, -1.0], dtype=np.float64)
-            model.addRow(route_durations[j], inf, 2, indices_np, values_np)
+    _add_row_block(model, np.tile(durations, U), np.full(U * R, inf),
+                   np.column_stack([T_prime_cols, T_cols]), np.tile([1.0, -1.0], (U * R, 1)))
     
     # Constraint (B.9): Calculate delay
-    for u in scenarios:
-        for j in routes:
-            indices_np = np.array([var_index[('delta', u, j)], var_index[('T_prime', u, j)]], dtype=np.int32)
-            values_np = np.array([1.0, -1.0], dtype=np.float64)
-            model.addRow(-route_end_times[j] + route_durations[j], inf, 2, indices_np, values_np)
+    _add_row_block(model, np.tile(durations - end_times, U), np.full(U * R, inf),
+                   np.column_stack([delta_cols, T_prime_cols]), np.tile([1.0, -1.0], (U * R, 1)))
     
     # Constraint (B.10): Non-negative delay
-    for u in scenarios:
-        for j in routes:
-            indices_np = np.array([var_index[('delta', u, j)]], dtype=np.int32)
-            values_np = np.array([1.0], dtype=np.float64)
-            model.addRow(0.0, inf, 1, indices_np, values_np)
+    _add_row_block(model, np.zeros(U * R), np.full(U * R, inf),
+                   delta_cols[:, None], np.ones((U * R, 1)))
     
     return model, var_mapping, var_index
@@ -2,23 +2,70 @@
 # -*- coding: utf-8 -*-
 import numpy as np
 import highspy
-import pandas as pd
 
-def solve_dip_model(model, var_mapping):
+def solve_dip_model(model, var_mapping, portfolio=None, time_limit=None):
     """
     Solve the D-IP model and interpret the results.
+    If a portfolio of HiGHS option sets is given, the solves are raced in
+    parallel processes and the first to prove optimality wins.
     """
-    # Run the solver
-    status = model.run()
+    if portfolio is not None:
+        # Race differently configured solves of the same model
+        from Race_solve import race_solve
+        race = race_solve(model, portfolio, time_limit)
+        if race['status'] != 'optimal':
+            print(f"Model did not solve to optimality. Status: {race['status']}")
+            return None
+        solution_values = race['col_value']
+        objective_value = race['objective_value']
+    else:
+        # The time limit applies to this solve only
+        if time_limit is not None:
+            _, previous_limit = model.getOptionValue("time_limit")
+            model.setOptionValue("time_limit", float(time_limit))
+        
+        # Run the solver
+        try:
+            status = model.run()
+        finally:
+            if time_limit is not None:
+                model.setOptionValue("time_limit", previous_limit)
+        
+        # Check if the solution is optimal
+        if model.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            print(f"Model did not solve to optimality. Status: {model.modelStatusToString(model.getModelStatus())}")
+            return None
+        
+        # Get the solution values
+        solution_values = model.getSolution().col_value
+        objective_value = model.getObjectiveValue()
     
-    # Check if the solution is optimal
-    if model.getModelStatus() != highspy.HighsModelStatus.kOptimal:
-        print(f"Model did not solve to optimality. Status: {model.modelStatus()}")
-        return None
+    return interpret_dip_solution(solution_values, var_mapping, objective_value)
+
+
+def solve_status(model):
+    """
+    HiGHS status and MIP bounds of the last solve of a model, e.g. to
+    report a solve that stopped at its time limit.
+    """
+    info = model.getInfo()
     
-    # Get the solution values
-    solution_values = model.getSolution().col_value
+    def finite(value):
+        return value if abs(value) < float('inf') else None
     
+    has_incumbent = info.primal_solution_status == highspy.SolutionStatus.kSolutionStatusFeasible
+    return {
+        'solver_status': model.modelStatusToString(model.getModelStatus()),
+        'primal_bound': finite(info.objective_function_value) if has_incumbent else None,
+        'dual_bound': finite(info.mip_dual_bound),
+        'mip_gap': finite(info.mip_gap) if has_incumbent else None,
+    }
+
+
+def interpret_dip_solution(solution_values, var_mapping, objective_value):
+    """
+    Turn D-IP column values into bus routes and unserved routes.
+    """
     # Interpret the solution
     bus_route_assignments = []
     unserved_routes = []
@@ -82,7 +129,5 @@ def solve_dip_model(model, var_mapping):
     return {
         'bus_assignments': bus_assignments,
         'unserved_routes': unserved_routes,
-        'objective_value': model.getObjectiveValue()
+        'objective_value': objective_value
     }
-
-
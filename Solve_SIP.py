@@ -1,24 +1,54 @@
 #!/usr/bin/env python3
 # -*- coding: utf-8 -*-
+import time
 import numpy as np
 import highspy
-import pandas as pd
+from SIP_model import sip_timing_rows, add_sip_timing_rows
 
-def solve_sip_model(model, var_mapping, scenarios, routes, scenario_probs):
+def solve_sip_model(model, var_mapping, scenarios, routes, scenario_probs, portfolio=None, time_limit=None):
     """
     Solve the S-IP model and interpret the results.
+    If a portfolio of HiGHS option sets is given, the solves are raced in
+    parallel processes and the first to prove optimality wins.
     """
-    # Run the solver
-    status = model.run()
-    
-    # Check if the solution is optimal
-    if model.getModelStatus() != highspy.HighsModelStatus.kOptimal:
-        print(f"Model did not solve to optimality. Status: {model.modelStatus()}")
-        return None
-    
-    # Get the solution values
-    solution_values = model.getSolution().col_value
+    if portfolio is not None:
+        # Race differently configured solves of the same model
+        from Race_solve import race_solve
+        race = race_solve(model, portfolio, time_limit)
+        if race['status'] != 'optimal':
+            print(f"Model did not solve to optimality. Status: {race['status']}")
+            return None
+        solution_values = race['col_value']
+        objective_value = race['objective_value']
+    else:
+        # The time limit applies to this solve only
+        if time_limit is not None:
+            _, previous_limit = model.getOptionValue("time_limit")
+            model.setOptionValue("time_limit", float(time_limit))
+        
+        # Run the solver
+        try:
+            status = model.run()
+        finally:
+            if time_limit is not None:
+                model.setOptionValue("time_limit", previous_limit)
+        
+        # Check if the solution is optimal
+        if model.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            print(f"Model did not solve to optimality. Status: {model.modelStatusToString(model.getModelStatus())}")
+            return None
+        
+        # Get the solution values
+        solution_values = model.getSolution().col_value
+        objective_value = model.getObjectiveValue()
     
+    return interpret_sip_solution(solution_values, var_mapping, routes, scenario_probs, objective_value)
+
+
+def interpret_sip_solution(solution_values, var_mapping, routes, scenario_probs, objective_value):
+    """
+    Turn S-IP column values into bus routes, unserved routes and delays.
+    """
     # Interpret the solution
     bus_route_assignments = []
     unserved_routes = []
@@ -96,6 +126,67 @@ def solve_sip_model(model, var_mapping, scenarios, routes, scenario_probs):
         'unserved_routes': unserved_routes,
         'expected_delays': expected_delays,
         'delays_by_scenario': delays,
-        'objective_value': model.getObjectiveValue()
+        'objective_value': objective_value
     }
 
+
+def solve_sip_model_lazy(model, var_mapping, scenarios, routes, scenario_probs,
+                         reposition_scenarios, route_end_times, route_start_times,
+                         max_rounds=100, time_limit=None, tol=1e-6):
+    """
+    Solve an S-IP model built with lazy_timing=True. After each solve the
+    delay propagation of the incumbent is checked against every (B.6) row
+    left out of the model, the violated rows are added and the model is
+    solved again, until no row is violated. The time limit covers all
+    rounds together.
+    """
+    timing = sip_timing_rows(var_mapping, scenarios, routes, reposition_scenarios,
+                             route_end_times, route_start_times)
+    added = timing['core'].copy()
+    R, M = timing['num_routes'], timing['M']
+    arc_prev, arc_next = timing['arc_prev'], timing['arc_next']
+    scenario_offsets = timing['T_start'] + np.arange(len(scenarios))[:, None] * R
+    
+    if time_limit is not None:
+        _, previous_limit = model.getOptionValue("time_limit")
+        deadline = time.perf_counter() + float(time_limit)
+    
+    for rounds in range(1, max_rounds + 1):
+        # Each round gets the time left of the overall limit
+        if time_limit is not None:
+            model.setOptionValue("time_limit", max(deadline - time.perf_counter(), 0.0))
+        
+        # Run the solver
+        try:
+            model.run()
+        finally:
+            if time_limit is not None:
+                model.setOptionValue("time_limit", previous_limit)
+        
+        # Check if the solution is optimal
+        if model.getModelStatus() != highspy.HighsModelStatus.kOptimal:
+            print(f"Model did not solve to optimality. Status: {model.modelStatusToString(model.getModelStatus())}")
+            return None
+        
+        solution_values = np.asarray(model.getSolution().col_value)
+        
+        # Activity of every (B.6) row in every scenario at the incumbent
+        T_next = solution_values[scenario_offsets + arc_next]
+        T_prev = solution_values[scenario_offsets + arc_prev]
+        y = solution_values[timing['arc_cols']]
+        activity = T_next - T_prev + (M - timing['rep_tensor'][:, arc_prev, arc_next]) * y
+        violated = (activity < -M - tol) & ~added
+        
+        if not violated.any():
+            result = interpret_sip_solution(solution_values, var_mapping, routes, scenario_probs,
+                                            model.getObjectiveValue())
+            result['lazy_rounds'] = rounds
+            result['timing_rows'] = int(added.sum())
+            return result
+        
+        scenario_idx, arc_idx = np.nonzero(violated)
+        add_sip_timing_rows(model, timing, scenario_idx, arc_idx)
+        added |= violated
+    
+    print(f"Lazy timing rows did not converge in {max_rounds} rounds")
+    return None
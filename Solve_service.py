@@ -0,0 +1,300 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Local job service running D-IP / S-IP solves for interactive planners.
+
+    python Solve_service.py --port 8765 --workers 4
+
+Clients send one JSON request per line over TCP and get one JSON line back:
+
+    {"op": "solve", "instance": "Data", "model": "dip", "params": {"c": 100}}
+        -> {"job_id": "...", "deduplicated": false}
+    {"op": "status", "job_id": "..."}
+        -> {"state": "running", "stage": "solving", "progress": {"mip_gap": 0.02, ...}}
+    {"op": "result", "job_id": "...", "wait": true}
+        -> {"state": "done", "result": {"bus_assignments": ..., ...}}
+    {"op": "cancel", "job_id": "..."}
+
+S-IP requests also carry "scenarios" and "scenario_probs" as in the
+Batch_run manifest. A solve identical to one still queued or running is
+attached to that job instead of being solved twice.
+"""
+import argparse
+import asyncio
+import hashlib
+import json
+import os
+import time
+import uuid
+import multiprocessing as mp
+from Batch_run import solve_job, json_default, _get_instance, _INSTANCES
+
+# Minimum time between two progress messages of a running solve (s)
+PROGRESS_INTERVAL = 0.5
+
+# Parsed instances kept in memory, least recently used dropped first
+MAX_INSTANCES = 4
+
+
+def _job_process(job, conn):
+    """
+    Entry point of a job process: solve and stream progress and the
+    result back to the service.
+    """
+    last_sent = {'stage': None, 'time': 0.0}
+
+    def progress(stage, info):
+        now = time.perf_counter()
+        if stage == last_sent['stage'] and now - last_sent['time'] < PROGRESS_INTERVAL:
+            return
+        last_sent.update(stage=stage, time=now)
+        conn.send(('progress', stage, info))
+
+    try:
+        record = solve_job(job, progress)
+    except Exception as exc:
+        record = {'status': 'failed', 'error': f'{type(exc).__name__}: {exc}'}
+    # Round trip through JSON so only plain values cross the pipe
+    conn.send(('done', None, json.loads(json.dumps(record, default=json_default))))
+    conn.close()
+
+
+def request_key(job):
+    """
+    Fingerprint of a solve request, used to deduplicate identical requests.
+    """
+    fields = {name: job.get(name) for name in
+              ('instance', 'model', 'params', 'scenarios', 'scenario_probs', 'time_limit')}
+    return hashlib.sha256(json.dumps(fields, sort_keys=True, default=repr).encode()).hexdigest()
+
+
+class SolveService:
+    """
+    Queue of solve jobs, each run in its own worker process so it can be
+    cancelled; at most `workers` processes run at the same time. At most
+    `max_instances` parsed instances are kept for later jobs.
+    """
+
+    def __init__(self, workers=None, max_instances=MAX_INSTANCES):
+        self.workers = workers or os.cpu_count() or 1
+        self.max_instances = max_instances
+        self.jobs = {}
+        self.in_flight = {}
+        self._slots = None
+        self._ctx = mp.get_context('fork')
+
+    async def submit(self, request):
+        """
+        Queue a solve request, or attach to an identical one in flight.
+        """
+        job = {
+            'instance': os.path.abspath(request['instance']),
+            'model': request.get('model', 'dip'),
+            'params': request.get('params', {}),
+            'scenarios': request.get('scenarios'),
+            'scenario_probs': request.get('scenario_probs'),
+            'time_limit': request.get('time_limit'),
+        }
+        key = request_key(job)
+        if key in self.in_flight:
+            entry = self.jobs[self.in_flight[key]]
+            entry['clients'] += 1
+            return {'job_id': entry['job_id'], 'deduplicated': True}
+
+        job_id = uuid.uuid4().hex
+        entry = {
+            'job_id': job_id,
+            'key': key,
+            'job': job,
+            'state': 'queued',
+            'stage': None,
+            'progress': {},
+            'result': None,
+            'clients': 1,
+            'process': None,
+            'submitted': time.time(),
+            'started': None,
+            'finished': None,
+            'done': asyncio.get_running_loop().create_future(),
+        }
+        self.jobs[job_id] = entry
+        self.in_flight[key] = job_id
+        entry['task'] = asyncio.ensure_future(self._run(entry))
+        return {'job_id': job_id, 'deduplicated': False}
+
+    async def _run(self, entry):
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.workers)
+        loop = asyncio.get_running_loop()
+        async with self._slots:
+            if entry['state'] != 'queued':
+                return
+            try:
+                # Parse the instance into the cache solve_job reads, so job
+                # processes inherit it. This runs on the event loop thread:
+                # an executor thread would make every later fork happen in a
+                # multithreaded process.
+                data_dir = entry['job']['instance']
+                _get_instance(data_dir)
+                # Most recently used last
+                _INSTANCES[data_dir] = _INSTANCES.pop(data_dir)
+                # Running jobs hold their own copy, so evicting is safe
+                while len(_INSTANCES) > self.max_instances:
+                    del _INSTANCES[next(iter(_INSTANCES))]
+            except Exception as exc:
+                self._finish(entry, 'failed', {'error': f'cannot load instance: {exc}'})
+                return
+
+            receiver, sender = self._ctx.Pipe(duplex=False)
+            process = self._ctx.Process(target=_job_process, args=(entry['job'], sender), daemon=True)
+            process.start()
+            sender.close()
+            entry.update(state='running', process=process, started=time.time())
+
+            # Messages from the job process arrive through the event loop
+            def on_message():
+                try:
+                    kind, stage, info = receiver.recv()
+                except (EOFError, OSError):
+                    kind, stage, info = 'done', None, {'status': 'failed',
+                                                      'error': f'worker exited with code {process.exitcode}'}
+                if kind == 'progress':
+                    entry['stage'] = stage
+                    entry['progress'] = dict(info, elapsed=time.time() - entry['started'])
+                    return
+                loop.remove_reader(receiver.fileno())
+                if entry['state'] == 'running':
+                    state = 'done' if info.get('status') != 'failed' else 'failed'
+                    self._finish(entry, state, info)
+
+            loop.add_reader(receiver.fileno(), on_message)
+            try:
+                await asyncio.shield(entry['done'])
+            finally:
+                loop.remove_reader(receiver.fileno())
+                receiver.close()
+                if process.is_alive():
+                    process.terminate()
+                while process.exitcode is None:
+                    await asyncio.sleep(0.05)
+                process.join()
+
+    def _finish(self, entry, state, result):
+        entry.update(state=state, result=result, finished=time.time())
+        if entry['stage'] is not None:
+            entry['stage'] = state
+        if self.in_flight.get(entry['key']) == entry['job_id']:
+            del self.in_flight[entry['key']]
+        if not entry['done'].done():
+            entry['done'].set_result(None)
+
+    def status(self, job_id):
+        entry = self.jobs[job_id]
+        return {
+            'job_id': job_id,
+            'state': entry['state'],
+            'stage': entry['stage'],
+            'progress': entry['progress'],
+            'clients': entry['clients'],
+            'queued_time': (entry['started'] or entry['finished'] or time.time()) - entry['submitted'],
+            'run_time': ((entry['finished'] or time.time()) - entry['started']) if entry['started'] else None,
+        }
+
+    async def result(self, job_id, wait=True):
+        entry = self.jobs[job_id]
+        if wait:
+            await asyncio.shield(entry['done'])
+        return dict(self.status(job_id), result=entry['result'])
+
+    def cancel(self, job_id):
+        """
+        Withdraw one client from a job; the solve itself is stopped once
+        no client is left waiting for it.
+        """
+        entry = self.jobs[job_id]
+        if entry['state'] not in ('queued', 'running'):
+            return self.status(job_id)
+        entry['clients'] -= 1
+        if entry['clients'] <= 0:
+            self._finish(entry, 'cancelled', None)
+        return self.status(job_id)
+
+    async def handle(self, request):
+        """
+        Dispatch one request and return the response.
+        """
+        op = request.get('op')
+        try:
+            if op == 'solve':
+                return await self.submit(request)
+            if op == 'status':
+                return self.status(request['job_id'])
+            if op == 'result':
+                return await self.result(request['job_id'], request.get('wait', True))
+            if op == 'cancel':
+                return self.cancel(request['job_id'])
+            if op == 'jobs':
+                return {'jobs': [self.status(job_id) for job_id in self.jobs]}
+        except KeyError as exc:
+            return {'error': f'unknown job or missing field: {exc}'}
+        return {'error': f'unknown op: {op}'}
+
+    async def serve_client(self, reader, writer):
+        try:
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                try:
+                    request = json.loads(line)
+                except ValueError as exc:
+                    response = {'error': f'invalid JSON: {exc}'}
+                else:
+                    response = await self.handle(request)
+                writer.write((json.dumps(response, default=json_default) + '\n').encode())
+                await writer.drain()
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+
+async def serve(host='127.0.0.1', port=8765, workers=None, max_instances=MAX_INSTANCES):
+    """
+    Run the service until cancelled.
+    """
+    service = SolveService(workers, max_instances)
+    server = await asyncio.start_server(service.serve_client, host, port)
+    async with server:
+        await server.serve_forever()
+
+
+async def call_service(request, host='127.0.0.1', port=8765):
+    """
+    Send one request to a running service and return its response.
+    """
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        writer.write((json.dumps(request) + '\n').encode())
+        await writer.drain()
+        return json.loads(await reader.readline())
+    finally:
+        writer.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Local solve service for the D-IP / S-IP models")
+    parser.add_argument('--host', default='127.0.0.1', help="address to listen on")
+    parser.add_argument('--port', type=int, default=8765, help="TCP port to listen on")
+    parser.add_argument('--workers', type=int, default=None, help="parallel solves (default: CPU count)")
+    parser.add_argument('--max-instances', type=int, default=MAX_INSTANCES,
+                        help="parsed instances kept in memory")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, args.workers, args.max_instances))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cold-start benchmark of the solver entry points, each measured in fresh
+interpreter processes:
+
+    python Startup_benchmark.py Data --repeat 5
+
+- import time of the main modules (and of pandas for reference)
+- time to first solve of Quick_solve.py, with and without the cached
+  instance, split into interpreter start + imports, load, build and solve
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import time
+
+MODULES = ('numpy', 'highspy', 'pandas', 'Load_data', 'DIP_model', 'Solve_DIP',
+           'SIP_model', 'Solve_SIP', 'Quick_solve')
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+
+def import_time(module, repeat=5):
+    """
+    Median time to import a module in a fresh interpreter.
+    """
+    code = f"import time; t = time.perf_counter(); import {module}; print(time.perf_counter() - t)"
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, '-c', code], cwd=HERE, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.split()[-1]))
+    return statistics.median(times)
+
+
+def first_solve_time(data_dir, repeat=5, use_cache=True, time_limit=None):
+    """
+    Median wall time from process launch to a decoded solution, with the
+    load, build and solve times reported by Quick_solve.py.
+    """
+    command = [sys.executable, os.path.join(HERE, 'Quick_solve.py'), data_dir]
+    if not use_cache:
+        command.append('--no-cache')
+    if time_limit is not None:
+        command += ['--time-limit', str(time_limit)]
+
+    runs = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        out = subprocess.run(command, cwd=HERE, capture_output=True, text=True, check=True)
+        wall_time = time.perf_counter() - start
+        result = json.loads(out.stdout.strip().splitlines()[-1])
+        steps = result['load_time'] + result['build_time'] + result['solve_time']
+        runs.append({'wall_time': wall_time, 'startup_time': wall_time - steps,
+                     'load_time': result['load_time'], 'build_time': result['build_time'],
+                     'solve_time': result['solve_time']})
+    return {key: statistics.median(run[key] for run in runs) for key in runs[0]}
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import time and time-to-first-solve benchmark")
+    parser.add_argument('instance', nargs='?', default=os.path.join(HERE, 'Data'), help="instance directory")
+    parser.add_argument('--repeat', type=int, default=5, help="fresh processes per measurement")
+    parser.add_argument('--time-limit', type=float, default=None, help="solver time limit in seconds")
+    args = parser.parse_args(argv)
+
+    print("Import time (median, s)")
+    for module in MODULES:
+        print(f"  {module:<12} {import_time(module, args.repeat):8.3f}")
+
+    print("Time to first solve (median, s)")
+    print(f"  {'':<12} {'wall':>8} {'startup':>8} {'load':>8} {'build':>8} {'solve':>8}")
+    for name, use_cache in (('csv', False), ('cached', True)):
+        # Make sure the cache exists before timing the cached runs
+        if use_cache:
+            first_solve_time(args.instance, 1, True, args.time_limit)
+        t = first_solve_time(args.instance, args.repeat, use_cache, args.time_limit)
+        print(f"  {name:<12} {t['wall_time']:8.3f} {t['startup_time']:8.3f} {t['load_time']:8.3f} "
+              f"{t['build_time']:8.3f} {t['solve_time']:8.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import os
+import time
+import multiprocessing as mp
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+import highspy
+from SIP_model import build_sip_model, reposition_tensor
+from Terminal_depots import as_depot_table
+
+# Binary variable types of the S-IP model: the first-stage plan
+PLAN_VARS = ('y_i0j', 'y_ijk', 'y_ij0', 'x_j')
+
+# Instance of the current worker process, set once by _init_worker
+_INSTANCE = {}
+
+
+def _init_worker(build_kwargs):
+    # Inherited through fork, so the instance is not pickled per task
+    _INSTANCE.update(build_kwargs)
+    highspy.Highs.resetGlobalScheduler(True)
+
+
+def mean_scenario(build_kwargs):
+    """
+    Collapse the scenarios of an S-IP instance into the single
+    expected-value scenario 'EV'.
+    """
+    scenario_probs = build_kwargs['scenario_probs']
+    scenarios = list(scenario_probs.keys())
+    probs = np.array([scenario_probs[u] for u in scenarios], dtype=np.float64)
+    buses, routes = build_kwargs['buses'], build_kwargs['routes']
+
+    rep_tensor = reposition_tensor(build_kwargs['reposition_scenarios'], scenarios, routes)
+    tables = [as_depot_table(buses, routes, build_kwargs['terminal_scenarios'][u]) for u in scenarios]
+    if any(table['bus_depot'] != tables[0]['bus_depot'] or table['routes'] != tables[0]['routes']
+           for table in tables):
+        raise ValueError("Terminal scenarios must share the same depots and routes")
+    mean_table = dict(tables[0],
+                      to_route=np.tensordot(probs, [table['to_route'] for table in tables], axes=1),
+                      from_route=np.tensordot(probs, [table['from_route'] for table in tables], axes=1))
+
+    return dict(build_kwargs,
+                reposition_scenarios=np.tensordot(probs, rep_tensor, axes=1)[None, :, :],
+                terminal_scenarios={'EV': mean_table},
+                scenario_probs={'EV': 1.0})
+
+
+def _scenario_instance(build_kwargs, u):
+    """
+    The S-IP instance with all weight on scenario u. The other scenarios
+    are kept at probability zero so that the same arcs as in the full
+    model remain available (arc feasibility uses the fastest scenario).
+    """
+    scenario_probs = {w: float(w == u) for w in build_kwargs['scenario_probs']}
+    return dict(build_kwargs, scenario_probs=scenario_probs)
+
+
+def _solve_case(case, time_limit=None):
+    """
+    Build and solve one problem of the evaluation:
+        ('rp', None)  the recourse problem over all scenarios
+        ('ws', u)     the wait-and-see problem of scenario u
+        ('ev', None)  the expected-value problem
+        ('eev', plan) all scenarios with the plan fixed to the EV plan
+    """
+    kind, arg = case
+    start = time.perf_counter()
+    if kind == 'ws':
+        build_kwargs = _scenario_instance(_INSTANCE, arg)
+    elif kind == 'ev':
+        build_kwargs = mean_scenario(_INSTANCE)
+    else:
+        build_kwargs = _INSTANCE
+    model, var_mapping, var_index = build_sip_model(**build_kwargs)
+
+    if kind == 'eev':
+        # Fix every first-stage variable to its value in the EV plan
+        cols = np.array([v for v, key in var_mapping.items() if key[0] in PLAN_VARS], dtype=np.int32)
+        values = np.array([float(var_mapping[v] in arg) for v in cols])
+        model.changeColsBounds(len(cols), cols, values, values)
+    if time_limit is not None:
+        model.setOptionValue("time_limit", float(time_limit))
+    build_time = time.perf_counter() - start
+
+    model.run()
+    status = model.getModelStatus()
+    record = {
+        'case': kind if arg is None or kind == 'eev' else f'{kind}:{arg}',
+        'status': model.modelStatusToString(status),
+        'objective_value': model.getObjectiveValue() if status == highspy.HighsModelStatus.kOptimal else None,
+        'build_time': build_time,
+        'solve_time': time.perf_counter() - start - build_time,
+    }
+    if kind == 'ev' and record['objective_value'] is not None:
+        col_value = model.getSolution().col_value
+        record['plan'] = {key for v, key in var_mapping.items() if key[0] in PLAN_VARS and col_value[v] > 0.5}
+    return record
+
+
+def stochastic_value(build_kwargs, time_limit=None, workers=None):
+    """
+    Expected value of perfect information (EVPI = RP - WS) and value of
+    the stochastic solution (VSS = EEV - RP) of an S-IP instance, where
+    RP is the S-IP optimum, WS the expected wait-and-see optimum and EEV
+    the expected cost of the expected-value plan. All problems are solved
+    in parallel worker processes that share the parsed instance.
+    """
+    if build_kwargs.get('lazy_timing'):
+        raise ValueError("The stochastic value needs the full S-IP model, build it without lazy_timing")
+    scenario_probs = build_kwargs['scenario_probs']
+    workers = workers or os.cpu_count() or 1
+    start = time.perf_counter()
+
+    records = {}
+    ctx = mp.get_context('fork')
+    with ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(build_kwargs,)) as pool:
+        # The EV problem goes first since the EEV evaluation waits on it
+        cases = [('ev', None), ('rp', None)] + [('ws', u) for u in scenario_probs]
+        futures = {pool.submit(_solve_case, case, time_limit): case for case in cases}
+        while futures:
+            future = next(as_completed(futures))
+            kind, arg = futures.pop(future)
+            record = future.result()
+            if kind == 'ev':
+                plan = record.pop('plan', None)
+                if plan is not None:
+                    futures[pool.submit(_solve_case, ('eev', plan), time_limit)] = ('eev', None)
+            records[record['case']] = record
+
+    def objective(case):
+        record = records.get(case)
+        return record['objective_value'] if record else None
+
+    rp = objective('rp')
+    ws_values = [objective(f'ws:{u}') for u in scenario_probs]
+    ws = None if None in ws_values else sum(scenario_probs[u] * ws_u for u, ws_u in zip(scenario_probs, ws_values))
+    eev = objective('eev')
+
+    return {
+        'RP': rp,
+        'WS': ws,
+        'EV': objective('ev'),
+        'EEV': eev,
+        'EVPI': rp - ws if rp is not None and ws is not None else None,
+        'VSS': eev - rp if rp is not None and eev is not None else None,
+        'solves': records,
+        'cpu_time': sum(record['build_time'] + record['solve_time'] for record in records.values()),
+        'wall_time': time.perf_counter() - start,
+    }
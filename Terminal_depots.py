@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+import numpy as np
+
+# A depot table replaces the per-(terminal, bus, route) dictionaries:
+#   'depots'     : list of depot names
+#   'bus_depot'  : dict mapping each bus to the index of its depot
+#   'routes'     : list of routes, in the column order of the arrays
+#   'to_route'   : (D x R) array, depot -> route start
+#   'from_route' : (D x R) array, route end -> depot
+
+
+def depot_table(buses, routes, terminal_values, bus_depots=None):
+    """
+    Convert a table keyed by ('terminal', bus, route) and
+    (route, 'terminal', bus) into a depot table. Without an explicit
+    bus -> depot mapping, buses with identical rows share a depot.
+    """
+    to_route = np.array([[terminal_values[('terminal', i, j)] for j in routes] for i in buses], dtype=np.float64)
+    from_route = np.array([[terminal_values[(j, 'terminal', i)] for j in routes] for i in buses], dtype=np.float64)
+    return _collapse_buses(buses, routes, to_route, from_route, bus_depots)
+
+
+def load_depot_table(csv_path, buses, routes, value_column, bus_depots=None):
+    """
+    Load a terminal times/miles CSV with columns from, bus, to and the
+    value column straight into a depot table.
+    """
+    # pandas is only needed here, keep it out of the solver import path
+    import pandas as pd
+    df = pd.read_csv(csv_path)
+    outbound = df[df['from'] == 'terminal'].pivot(index='bus', columns='to', values=value_column)
+    # Return rows are stored as (route, 'terminal', bus)
+    inbound = df[df['bus'] == 'terminal'].pivot(index='to', columns='from', values=value_column)
+    to_route = outbound.loc[buses, routes].to_numpy(dtype=np.float64)
+    from_route = inbound.loc[buses, routes].to_numpy(dtype=np.float64)
+    return _collapse_buses(buses, routes, to_route, from_route, bus_depots)
+
+
+def _collapse_buses(buses, routes, to_route, from_route, bus_depots):
+    """
+    Keep one row per depot instead of one row per bus.
+    """
+    if bus_depots is None:
+        # Buses with identical terminal rows are treated as one depot
+        rows = np.hstack([to_route, from_route])
+        _, first, inverse = np.unique(rows, axis=0, return_index=True, return_inverse=True)
+        inverse = inverse.reshape(-1)
+        # Number depots in order of first appearance
+        order = np.argsort(first)
+        rank = np.empty_like(order)
+        rank[order] = np.arange(len(order))
+        depot_of_bus = rank[inverse]
+        depots = [f'D{n + 1}' for n in range(len(order))]
+        keep = first[order]
+    else:
+        depots = list(dict.fromkeys(bus_depots[i] for i in buses))
+        depot_pos = {d: n for n, d in enumerate(depots)}
+        depot_of_bus = np.array([depot_pos[bus_depots[i]] for i in buses])
+        _, keep = np.unique(depot_of_bus, return_index=True)
+        # Buses of one depot must share its terminal rows
+        if not (np.array_equal(to_route, to_route[keep][depot_of_bus])
+                and np.array_equal(from_route, from_route[keep][depot_of_bus])):
+            raise ValueError("Buses mapped to the same depot have different terminal values")
+
+    return {
+        'depots': depots,
+        'bus_depot': {i: int(d) for i, d in zip(buses, depot_of_bus)},
+        'routes': list(routes),
+        'to_route': to_route[keep],
+        'from_route': from_route[keep],
+    }
+
+
+def as_depot_table(buses, routes, terminal_values):
+    """
+    Accept either a depot table or a legacy per-bus dictionary.
+    """
+    if isinstance(terminal_values, dict) and 'bus_depot' in terminal_values:
+        return terminal_values
+    return depot_table(buses, routes, terminal_values)
+
+
+def scaled_depot_table(table, factor):
+    """
+    Depot table with every terminal value multiplied by factor.
+    """
+    return dict(table, to_route=table['to_route'] * factor, from_route=table['from_route'] * factor)
+
+
+def depot_lookup(table, bus_list, route_list, direction='to_route'):
+    """
+    Vectorized lookup of terminal values for parallel lists of buses and
+    routes. direction is 'to_route' (depot -> route) or 'from_route'
+    (route -> depot).
+    """
+    route_pos = {j: n for n, j in enumerate(table['routes'])}
+    depot_idx = np.fromiter((table['bus_depot'][i] for i in bus_list), dtype=np.int64, count=len(bus_list))
+    route_idx = np.fromiter((route_pos[j] for j in route_list), dtype=np.int64, count=len(route_list))
+    return table[direction][depot_idx, route_idx]
@@ -5,6 +5,7 @@ from SIP_model import build_sip_model
 from DIP_model import build_dip_model
 from Solve_DIP import solve_dip_model
 from Solve_SIP import solve_sip_model
+from Terminal_depots import load_depot_table, scaled_depot_table
 import pandas as pd
 import numpy as np
 
@@ -88,19 +89,17 @@ reposition_miles = {
     if from_route != to_route and not pd.isna(df_2.loc[from_route, to_route])
 }
 
-# Load terminal times
-terminal_times_df = pd.read_csv("/Users/rongzhi/Downloads/terminal_times_mean10.csv")
-terminal_times = {
-    (row['from'], row['bus'], row['to']): int(row['time'])
-    for _, row in terminal_times_df.iterrows()
-}
+# Depot of each bus, e.g. {'B1': 'North', 'B2': 'North', ...}. The sample
+# CSVs give every bus its own terminal rows, so there is one depot per bus
+bus_depots = None
+
+# Load terminal times (buses mapped to depots, depot x route arrays)
+terminal_times = load_depot_table("/Users/rongzhi/Downloads/terminal_times_mean10.csv", buses, routes, 'time',
+                                  bus_depots)
 
 # Load terminal miles
-terminal_miles_df = pd.read_csv("/Users/rongzhi/Downloads/terminal_miles_mean3.csv")
-terminal_miles = {
-    (row['from'], row['bus'], row['to']): float(row['miles'])
-    for _, row in terminal_miles_df.iterrows()
-}
+terminal_miles = load_depot_table("/Users/rongzhi/Downloads/terminal_miles_mean3.csv", buses, routes, 'miles',
+                                  bus_depots)
 
 # Current solution (empty in this example)
 current_solution = {
@@ -122,9 +121,9 @@ reposition_scenarios = {
 
 # Terminal time scenarios
 terminal_scenarios = {
-    'S1': {k: v * 0.9 for k, v in terminal_times.items()},
-    'S2': {k: v for k, v in terminal_times.items()},
-    'S3': {k: v * 1.2 for k, v in terminal_times.items()}
+    'S1': scaled_depot_table(terminal_times, 0.9),
+    'S2': scaled_depot_table(terminal_times, 1.0),
+    'S3': scaled_depot_table(terminal_times, 1.2)
 }
 
 # Build and solve the D-IP model